@@ -10,18 +10,31 @@ from streamlit_folium import st_folium
 from datetime import datetime
 # --- Tout les imports de src ---
 from src.parsers import (
-    parse_postes_kml_optimized,
-    parse_gmr_kml_optimized,
-    parse_gdp_kml_optimized,
     parse_postes_kml,
     parse_gmr_kml
 )
+from src.datasets import (
+    DATASET_HASH_FUNCS,
+    load_postes_dataset,
+    load_gmr_dataset,
+    load_gdp_dataset
+)
 from src.map_utils import (
-    point_in_polygon,
     create_map_with_gmr_gdp,
-    find_gmr_for_poste,
-    find_gdp_for_poste
+    find_postes_near,
+    find_postes_in_drawings,
+    create_selection_map,
+    create_zones_layer,
+    lod_for_zoom,
+    initial_viewport,
+    viewport_bounds,
+    poste_zone_positions,
+    parse_feature_id
 )
+from src.map_cache import MapCache, map_key
+from src.search_index import postes_fuzzy_index, postes_token_index
+from src.static_layers import postes_layer_url, zone_layer_url
+from src.spatial import ZONE_COLUMNS, zone_row
 from src.auth import (
     hash_password,
     verify_password,
@@ -32,78 +45,91 @@ from src.auth import (
 from src.config import get_mongodb_url
 from src.performance_config import (
     CACHE_TTL_DATA, CACHE_TTL_SEARCH, MIN_SEARCH_LENGTH, 
-    MAX_SEARCH_RESULTS, AUTO_SELECT_COUNT, DISPLAY_COLUMNS, HELP_MESSAGES,
-    MAP_RETURN_ON_HOVER, MAP_RETURNED_OBJECTS, MAP_USE_CONTAINER_WIDTH
+    MAX_SEARCH_RESULTS, MAX_SEARCH_SUGGESTIONS, AUTO_SELECT_COUNT, DISPLAY_COLUMNS, HELP_MESSAGES,
+    PROXIMITY_DEFAULT_RADIUS_KM, PROXIMITY_MAX_RADIUS_KM, PROXIMITY_DEFAULT_COUNT,
+    MAP_RETURN_ON_HOVER, MAP_RETURNED_OBJECTS, MAP_USE_CONTAINER_WIDTH, MAP_VIEWPORT_CULLING,
+    MAP_DEFAULT_ZOOM, MAP_SINGLE_POSTE_ZOOM, MAP_CLUSTER_THRESHOLD, MAP_CACHE_MAX_BYTES, MAP_STATIC_LAYERS, POLYGON_DEFAULT_LOD
 )
 
 # Configuration de la page 
 st.set_page_config(layout="wide", page_icon="🍔", page_title="BURGER - Recherche Postes RTE")
 
-# Cache global pour les données KML
-@st.cache_data(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement initial des données...")
+# Cache global pour les données KML : cache_resource partage le même DataFrame entre sessions
+# sans le recopier (les coordonnées restent des vues sur le cache mmap de data/).
+# Chaque jeu de données porte une version stable qui sert de clé aux fonctions en cache_data.
+@st.cache_resource(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement initial des données...")
 def load_postes_data():
-    """Charge et met en cache les données des postes"""
-    return parse_postes_kml_optimized()
+    """Charge et met en cache les données des postes (avec leur GMR/GDP précalculés)"""
+    return load_postes_dataset()
 
-@st.cache_data(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement des données GMR...")
-def load_gmr_data(high_precision=False):
-    """Charge et met en cache les données GMR"""
-    return parse_gmr_kml_optimized(high_precision)
+# Un chargement par niveau de détail : passer d'un zoom à l'autre ne vide aucun cache
+@st.cache_resource(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement des données GMR...")
+def load_gmr_data(level=POLYGON_DEFAULT_LOD):
+    """Charge et met en cache les données GMR au niveau de détail demandé (None = pleine précision)"""
+    return load_gmr_dataset(level)
 
-@st.cache_data(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement des données GDP...")
-def load_gdp_data(high_precision=False):
-    """Charge et met en cache les données GDP"""
-    return parse_gdp_kml_optimized(high_precision)
+@st.cache_resource(ttl=CACHE_TTL_DATA, show_spinner="🔄 Chargement des données GDP...")
+def load_gdp_data(level=POLYGON_DEFAULT_LOD):
+    """Charge et met en cache les données GDP au niveau de détail demandé (None = pleine précision)"""
+    return load_gdp_dataset(level)
 
-# Cache pour les fonctions de recherche - évite les recalculs
-@st.cache_data(ttl=CACHE_TTL_SEARCH)
-def prepare_search_data(postes_df):
-    """Prépare les données de recherche optimisées"""
-    import re
-    import unicodedata
-    
-    nom_col = 'Nom poste' if 'Nom poste' in postes_df.columns else 'Nom_du_pos'
-    ARTICLES = {"le", "la", "les", "l"}
-    
-    def clean_and_split(s):
-        if pd.isna(s):
-            return []
-        s = str(s).lower()
-        s = unicodedata.normalize('NFKD', s)
-        s = ''.join([c for c in s if not unicodedata.combining(c)])
-        s = re.sub(r"[-()]+", " ", s)
-        words = [w for w in s.split() if w not in ARTICLES]
-        return sorted(words)
-    
-    search_df = postes_df.copy()
-    search_df["_nom_clean_list"] = search_df[nom_col].apply(clean_and_split)
-    return search_df
+# Cache des cartes générées, commun à toutes les sessions (LRU borné en octets)
+@st.cache_resource
+def get_map_cache():
+    return MapCache(MAP_CACHE_MAX_BYTES)
 
-@st.cache_data(ttl=CACHE_TTL_SEARCH)
-def search_postes(search_df, search_nom):
-    # Effectue la recherche de postes
+@st.cache_data(ttl=CACHE_TTL_SEARCH, hash_funcs=DATASET_HASH_FUNCS)
+def search_postes(postes, search_nom):
+    # Effectue la recherche de postes : intersection des listes de l'index, sans parcourir tous les noms
+    # Le dernier mot saisi est un préfixe : « soul » trouve déjà Soullans
+    return postes.df.iloc[postes_token_index(postes).query(search_nom, prefix=True)]
+
+def apply_search_suggestion(key="search_suggestion"):
+    # Remplace la saisie par la suggestion choisie (callback, exécuté avant la création du champ)
+    choice = st.session_state.get(key)
+    if choice:
+        st.session_state.search_input_main = choice
+    st.session_state[key] = None
+
+def parse_point_input(text):
+    # Lit « latitude, longitude » en degrés décimaux (séparateur virgule, point-virgule ou espace)
     import re
-    import unicodedata
-    
-    ARTICLES = {"le", "la", "les", "l"}
-    
-    def clean_and_split(s):
-        if pd.isna(s):
-            return []
-        s = str(s).lower()
-        s = unicodedata.normalize('NFKD', s)
-        s = ''.join([c for c in s if not unicodedata.combining(c)])
-        s = re.sub(r"[-()]+", " ", s)
-        words = [w for w in s.split() if w not in ARTICLES]
-        return sorted(words)
     
-    search_nom_clean_list = clean_and_split(search_nom)
-    
-    def match_words(row_words, search_words):
-        return set(search_words) <= set(row_words)
+    parts = re.split(r"[,;\s]+", (text or "").strip())
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+def show_feature_card(popup_text, postes_df, gmr_df, gdp_df):
+    # Fiche de l'objet cliqué sur la carte : son popup ne porte que l'identifiant, le détail est lu ici
+    kind, key = parse_feature_id(popup_text)
+    gmr_info = gdp_info = None
+    if kind == 'poste':
+        rows = postes_df[postes_df['Identifian'] == key]
+        if rows.empty:
+            return
+        poste = rows.iloc[0]
+        tensions = ", ".join(rows['Tension_d'].dropna().astype(str).unique()) or 'N/A'
+        st.markdown(f"#### 🔴 {poste.get('Nom_du_pos', 'N/A')}")
+        st.markdown(f"**ID :** {key} — **Tension :** {tensions} — **Coordonnées :** {poste['latitude']:.4f}, {poste['longitude']:.4f}")
+        # Zones lues dans la jointure précalculée du poste
+        gmr_info = zone_row(gmr_df, poste_zone_positions(rows.head(1), 'gmr_idx', gmr_df)[0])
+        gdp_info = zone_row(gdp_df, poste_zone_positions(rows.head(1), 'gdp_idx', gdp_df)[0])
+    elif kind == 'GMR':
+        gmr_info = zone_row(gmr_df, key)
+    elif kind == 'GDP':
+        gdp_info = zone_row(gdp_df, key)
     
-    result = search_df[search_df["_nom_clean_list"].apply(lambda x: match_words(x, search_nom_clean_list))]
-    return result.drop(columns=["_nom_clean_list"], errors='ignore')
+    if gmr_info is not None:
+        st.info(f"🔵 **{gmr_info.get('GMR_alias', 'N/A')}** (Code: {gmr_info.get('GMR', 'N/A')}) - Siège: {gmr_info.get('Siège_du_', 'N/A')}")
+    if gdp_info is not None:
+        st.success(f"🟢 **{gdp_info.get('Poste', 'N/A')}** (Code: {gdp_info.get('Code', 'N/A')}) - DI: {gdp_info.get('Nom_du_cen', 'N/A')} - GMR: {gdp_info.get('GMR', 'N/A')}")
 
 # Vérifier l'authentification
 if check_password():
@@ -119,56 +145,23 @@ if check_password():
         if st.button("🚪 Se déconnecter"):
             # Vider le cache utilisateur pour forcer une reconnexion suite à une déconnexion
             for key in list(st.session_state.keys()):
-                if key.startswith(('password', 'current_user', 'precision_')):
+                if key.startswith(('password', 'current_user')):
                     del st.session_state[key]
             st.rerun()
 
-    # Initialisation des variables de session
-    if 'precision_gmr' not in st.session_state:
-        st.session_state.precision_gmr = False
-    if 'precision_gdp' not in st.session_state:
-        st.session_state.precision_gdp = False
-
-    # Options de performance avec session state pour affiner une recherche avec les polygones exacts des KML
-    with st.expander("⚙️ Options de performance", expanded=False):
-        col_gmr_prec, col_gdp_prec = st.columns(2)
-        with col_gmr_prec:
-            new_precision_gmr = st.checkbox(
-                "🔵 Précision maximale des polygones GMR (très longue latence)", 
-                value=st.session_state.precision_gmr,
-                key="precision_gmr_checkbox"
-            )
-        with col_gdp_prec:
-            new_precision_gdp = st.checkbox(
-                "🟢 Précision maximale des polygones GDP (très longue latence)", 
-                value=st.session_state.precision_gdp,
-                key="precision_gdp_checkbox"
-            )
-        
-        # Détecter les changements et mettre à jour le session state
-        if new_precision_gmr != st.session_state.precision_gmr:
-            st.session_state.precision_gmr = new_precision_gmr
-            # Vider le cache pour forcer le rechargement avec nouvelle précision
-            st.cache_data.clear()
-            
-        if new_precision_gdp != st.session_state.precision_gdp:
-            st.session_state.precision_gdp = new_precision_gdp
-            # Vider le cache pour forcer le rechargement avec nouvelle précision
-            st.cache_data.clear()
-            
-            st.info(HELP_MESSAGES['precision_info'])
-
     # Chargement des données avec gestion d'erreurs
     try:
         # Chargement des postes (toujours nécessaire)
-        postes_df = load_postes_data()
+        postes = load_postes_data()
+        postes_df = postes.df
         
-        # Préparation des données de recherche
-        search_df = prepare_search_data(postes_df)
+        # Préparation de l'index de recherche
+        postes_token_index(postes)
         
-        # Chargement conditionnel des GMR et GDP selon les options
-        gmr_df = load_gmr_data(st.session_state.precision_gmr)
-        gdp_df = load_gdp_data(st.session_state.precision_gdp)
+        # GMR et GDP au niveau par défaut (attributs) ; la carte charge le niveau adapté au zoom
+        gmr = load_gmr_data()
+        gdp = load_gdp_data()
+        gmr_df, gdp_df = gmr.df, gdp.df
         
     except Exception as e:
         st.error(f"❌ Erreur lors du chargement des données : {e}")
@@ -188,20 +181,75 @@ if check_password():
     col1, col2, col3, col4, col5 = st.columns([1,2,3,2,1])
 
     with col3:
-        # Fenêtre de recherche
-        search_nom = st.text_input(
-            "🔎 Entrez le nom du poste:", 
-            key="search_input_main",
-            placeholder=HELP_MESSAGES['search_placeholder']
+        # Mode de recherche : par nom ou postes à proximité d'un point
+        search_mode = st.radio(
+            "Mode de recherche",
+            ["🔎 Recherche par nom", "📍 Postes à proximité", "✏️ Sélection sur la carte"],
+            horizontal=True,
+            key="search_mode",
+            label_visibility="collapsed"
         )
+        proximity_mode = search_mode == "📍 Postes à proximité"
+        selection_mode = search_mode == "✏️ Sélection sur la carte"
+
+        if selection_mode:
+            search_nom = ""
+            proximity_point = ""
+        elif not proximity_mode:
+            # Fenêtre de recherche
+            search_nom = st.text_input(
+                "🔎 Entrez le nom du poste:", 
+                key="search_input_main",
+                placeholder=HELP_MESSAGES['search_placeholder']
+            )
+            proximity_point = ""
+            # Complétion du dernier mot : noms classés, lus dans l'index trié des tokens (sans parcours des postes)
+            if len(search_nom.strip()) >= MIN_SEARCH_LENGTH:
+                suggestions = postes_token_index(postes).suggest(search_nom, MAX_SEARCH_SUGGESTIONS)
+                if search_nom.strip().lower() not in {name.lower() for name in suggestions}:
+                    st.pills(
+                        "Suggestions",
+                        suggestions,
+                        key="search_suggestion",
+                        on_change=apply_search_suggestion,
+                        label_visibility="collapsed"
+                    )
+        else:
+            search_nom = ""
+            proximity_point = st.text_input(
+                "📍 Coordonnées du point (latitude, longitude):",
+                key="proximity_input",
+                placeholder=HELP_MESSAGES['proximity_placeholder']
+            )
+            col_criterion, col_value = st.columns(2)
+            with col_criterion:
+                proximity_criterion = st.radio(
+                    "Critère",
+                    ["Dans un rayon", "Les plus proches"],
+                    horizontal=True,
+                    key="proximity_criterion"
+                )
+            with col_value:
+                if proximity_criterion == "Dans un rayon":
+                    proximity_query = {"radius_km": st.number_input(
+                        "Rayon (km)", min_value=1.0, max_value=PROXIMITY_MAX_RADIUS_KM,
+                        value=PROXIMITY_DEFAULT_RADIUS_KM, step=5.0, key="proximity_radius"
+                    )}
+                else:
+                    proximity_query = {"k": st.number_input(
+                        "Nombre de postes", min_value=1, max_value=MAX_SEARCH_RESULTS,
+                        value=PROXIMITY_DEFAULT_COUNT, step=1, key="proximity_count"
+                    )}
 
         # Options d'affichage du session state
         if 'show_gmr' not in st.session_state:
             st.session_state.show_gmr = False
         if 'show_gdp' not in st.session_state:
             st.session_state.show_gdp = False
+        if 'show_postes' not in st.session_state:
+            st.session_state.show_postes = False
             
-        col_gmr, col_gdp = st.columns(2)
+        col_gmr, col_gdp, col_postes = st.columns(3)
         with col_gmr:
             new_show_gmr = st.checkbox(
                 "🔵 Afficher tous les GMR", 
@@ -222,11 +270,42 @@ if check_password():
             st.session_state.show_gdp = new_show_gdp
             show_all_gdp = st.session_state.show_gdp
 
+        with col_postes:
+            new_show_postes = st.checkbox(
+                "⚡ Afficher tous les postes", 
+                value=st.session_state.show_postes,
+                key="show_postes_checkbox"
+            )
+            # Mise à jour silencieuse du session state
+            st.session_state.show_postes = new_show_postes
+            show_all_postes = st.session_state.show_postes
+
+    # Carte de sélection : les postes contenus dans les zones dessinées forment le résultat
+    selection_drawings = []
+    if selection_mode:
+        selection_data = st_folium(
+            create_selection_map(),
+            height=450,
+            key="selection_map",
+            returned_objects=["all_drawings"],
+            use_container_width=True
+        )
+        selection_drawings = (selection_data or {}).get("all_drawings") or []
+
     # Traitement de la recherche avec optimisations
-    if search_nom and len(search_nom.strip()) >= MIN_SEARCH_LENGTH:
+    proximity_center = parse_point_input(proximity_point) if proximity_mode else None
+    if proximity_center or selection_drawings or (search_nom and len(search_nom.strip()) >= MIN_SEARCH_LENGTH):
         try:
-            # Recherche optimisée avec cache
-            result = search_postes(search_df, search_nom)
+            # Recherche optimisée avec cache (KD-tree des postes pour la recherche à proximité)
+            if proximity_center:
+                result = find_postes_near(*proximity_center, postes, **proximity_query)
+                search_label = f"{proximity_center}_{proximity_query}"
+            elif selection_drawings:
+                result = find_postes_in_drawings(selection_drawings, postes)
+                search_label = str(selection_drawings)
+            else:
+                result = search_postes(postes, search_nom)
+                search_label = search_nom
             
             if not result.empty:
                 # Limiter le nombre de résultats pour les performances
@@ -235,7 +314,7 @@ if check_password():
                     result = result.head(MAX_SEARCH_RESULTS)
                 
                 # Interface optimisée avec cache de l'état de sélection
-                result_key = f"result_{hash(search_nom)}_{len(result)}"
+                result_key = f"result_{hash(search_label)}_{len(result)}"
                 
                 # Création de deux colonnes : tableau et carte avec répartition 50/50
                 col_table, col_map = st.columns([1, 1], gap="large")
@@ -244,7 +323,8 @@ if check_password():
                     st.subheader(f"📋 {len(result)} résultat(s) trouvé(s)")
                     
                     # Préparation optimisée des données d'affichage
-                    result_for_editor = result[DISPLAY_COLUMNS].copy()
+                    display_columns = DISPLAY_COLUMNS + [col for col in ["distance_km"] if col in result.columns]
+                    result_for_editor = result[display_columns].copy()
                     result_for_editor["Sélectionner"] = False
                     
                     # Réorganiser les colonnes pour avoir "Sélectionner" en premier
@@ -270,13 +350,17 @@ if check_password():
                             "Identifian": st.column_config.TextColumn("Identifiant"),
                             "Tension_d": st.column_config.TextColumn("Tension"),
                             "latitude": st.column_config.NumberColumn("Latitude", format="%.6f"),
-                            "longitude": st.column_config.NumberColumn("Longitude", format="%.6f")
+                            "longitude": st.column_config.NumberColumn("Longitude", format="%.6f"),
+                            "distance_km": st.column_config.NumberColumn("Distance (km)", format="%.1f")
                         },
                         key=result_key
                     )
 
                     # Filtrer les lignes du tableau pour n'afficher que les lignes sélectionnées
                     filtered_result = selected_result[selected_result["Sélectionner"] == True].drop(columns=["Sélectionner"])
+                    # Réattacher les GMR/GDP précalculés (non affichés dans le tableau)
+                    zone_columns = [col for col in ZONE_COLUMNS if col in postes_df.columns]
+                    filtered_result = filtered_result.join(postes_df[zone_columns])
 
                     if not filtered_result.empty:
                         # Création des liens de navigation
@@ -293,33 +377,22 @@ if check_password():
                         
                         # Informations GMR et GDP avec cache
                         with st.expander("🏢 Informations GMR et GDP", expanded=True):
-                            gmr_info_cache = {}
-                            gdp_info_cache = {}
-                            
-                            for idx, row in filtered_result.iterrows():
-                                if pd.notna(row.get('latitude')) and pd.notna(row.get('longitude')):
-                                    coord_key = (row['latitude'], row['longitude'])
-                                    
-                                    # Cache GMR
-                                    if coord_key not in gmr_info_cache:
-                                        gmr_info_cache[coord_key] = find_gmr_for_poste(row['latitude'], row['longitude'], gmr_df)
-                                    
-                                    # Cache GDP
-                                    if coord_key not in gdp_info_cache:
-                                        gdp_info_cache[coord_key] = find_gdp_for_poste(row['latitude'], row['longitude'], gdp_df)
+                            # Lecture directe des GMR/GDP précalculés pour chaque poste
+                            gmr_positions = poste_zone_positions(filtered_result, 'gmr_idx', gmr_df)
+                            gdp_positions = poste_zone_positions(filtered_result, 'gdp_idx', gdp_df)
                             
                             # Affichage des informations
                             unique_gmr = set()
                             unique_gdp = set()
                             
-                            for coord_key in gmr_info_cache:
-                                gmr_info = gmr_info_cache[coord_key]
+                            for gmr_pos in set(gmr_positions.tolist()):
+                                gmr_info = zone_row(gmr_df, gmr_pos)
                                 if gmr_info is not None:
                                     gmr_tuple = (gmr_info.get('GMR_alias', 'N/A'), gmr_info.get('GMR', 'N/A'), gmr_info.get('Siège_du_', 'N/A'))
                                     unique_gmr.add(gmr_tuple)
                             
-                            for coord_key in gdp_info_cache:
-                                gdp_info = gdp_info_cache[coord_key]
+                            for gdp_pos in set(gdp_positions.tolist()):
+                                gdp_info = zone_row(gdp_df, gdp_pos)
                                 if gdp_info is not None:
                                     gdp_tuple = (gdp_info.get('Poste', 'N/A'), gdp_info.get('Code', 'N/A'), gdp_info.get('Nom_du_cen', 'N/A'))
                                     unique_gdp.add(gdp_tuple)
@@ -341,21 +414,51 @@ if check_password():
                         st.subheader("🗺️ Carte interactive")
                         
                         # Création optimisée de la carte avec cache stable
-                        # Utiliser un hash du contenu pour éviter les regenerations intempestives
-                        postes_hash = hash(tuple(sorted(filtered_result.index.tolist())))
-                        options_hash = hash((show_all_gmr, show_all_gdp, st.session_state.precision_gmr, st.session_state.precision_gdp))
-                        map_cache_key = f"stable_map_{postes_hash}_{options_hash}"
+                        # Clé dérivée du contenu (version des postes, postes affichés, options) : une carte identique
+                        # est partagée entre utilisateurs par le cache LRU du processus, borné en taille.
+                        # Les zones sont dans une couche à part : seule l'option des postes change la carte
+                        map_cache_key = "stable_map_" + map_key(postes.version, filtered_result.index, (show_all_postes,))
                         
                         # Container fixe pour éviter le saut de page
                         map_container = st.container()
                         with map_container:
-                            # Vérifier si la carte existe déjà en cache
-                            if f"cached_map_{map_cache_key}" not in st.session_state:
+                            # Carte en cache (marqueurs seuls, les zones sont dans une couche à part) ; le cache rend
+                            # une copie à chaque lecture : st_folium peut y ajouter la couche des zones.
+                            # « Afficher tous les postes » : la carte ne contient que l'URL statique des postes
+                            all_postes_url = postes_layer_url(postes) if show_all_postes and MAP_STATIC_LAYERS else None
+                            def build_map():
                                 with st.spinner("🗺️ Génération de la carte..."):
-                                    map_obj = create_map_with_gmr_gdp(filtered_result, gmr_df, gdp_df, show_all_gmr, show_all_gdp)
-                                    st.session_state[f"cached_map_{map_cache_key}"] = map_obj
+                                    return create_map_with_gmr_gdp(
+                                        filtered_result, gmr, gdp, draw_zones=False,
+                                        all_postes=postes if show_all_postes else None, all_postes_url=all_postes_url
+                                    )
+                            if show_all_postes and not all_postes_url:
+                                # Tous les postes embarqués dans la carte : pas de mise en cache, chaque
+                                # sélection en garderait sinon une copie complète
+                                map_obj = build_map()
                             else:
-                                map_obj = st.session_state[f"cached_map_{map_cache_key}"]
+                                map_obj = get_map_cache().get_or_create(map_cache_key, build_map)
+                            
+                            # Dernière vue renvoyée par la carte (valeur du composant), sinon vue initiale :
+                            # le zoom choisit le niveau de détail des polygones, l'emprise limite « Afficher tous »
+                            last_view = st.session_state.get(map_cache_key) or {}
+                            zoom = last_view.get("zoom") or (MAP_SINGLE_POSTE_ZOOM if len(filtered_result) == 1 else MAP_DEFAULT_ZOOM)
+                            level = lod_for_zoom(zoom)
+                            gmr_level, gdp_level = load_gmr_data(level), load_gdp_data(level)
+                            # « Afficher tous » : couches complètes écrites une fois par version dans static/,
+                            # la carte n'en contient que l'URL ; à défaut, découpage à la vue
+                            static_urls = {}
+                            if MAP_STATIC_LAYERS:
+                                for kind, zones, show_all in (("GMR", gmr_level, show_all_gmr), ("GDP", gdp_level, show_all_gdp)):
+                                    if show_all:
+                                        static_urls[kind] = zone_layer_url(kind, zones)
+                            bounds = None
+                            if MAP_VIEWPORT_CULLING and ((show_all_gmr and not static_urls.get("GMR")) or (show_all_gdp and not static_urls.get("GDP"))):
+                                bounds = viewport_bounds(last_view.get("bounds")) or initial_viewport(filtered_result)
+                            zones_layer = create_zones_layer(
+                                filtered_result, gmr_level, gdp_level,
+                                bounds, show_all_gmr, show_all_gdp, static_urls
+                            )
                             
                             # Affichage de la carte avec configuration anti rechargement
                             map_data = st_folium(
@@ -363,18 +466,31 @@ if check_password():
                                 width=700, 
                                 height=500,
                                 key=map_cache_key,
-                                returned_objects=MAP_RETURNED_OBJECTS,  # Configuration anti rechargement (j'avais un soucis qui faisait que la carte se regenerait à chaque interaction avec la souris)
+                                returned_objects=MAP_RETURNED_OBJECTS + (["bounds"] if bounds is not None else []),  # Configuration anti rechargement (j'avais un soucis qui faisait que la carte se regenerait à chaque interaction avec la souris)
                                 return_on_hover=MAP_RETURN_ON_HOVER,  # Désactiver les événements de survol
-                                use_container_width=MAP_USE_CONTAINER_WIDTH  # Largeur fixe pour stabilité
+                                use_container_width=MAP_USE_CONTAINER_WIDTH,  # Largeur fixe pour stabilité
+                                feature_group_to_add=zones_layer
                             )
+                            
+                            # Fiche détaillée de l'objet cliqué (poste, GMR ou GDP)
+                            if map_data and map_data.get("last_object_clicked_popup"):
+                                show_feature_card(map_data["last_object_clicked_popup"], postes_df, gmr_df, gdp_df)
                         
                         # Légende
                         st.markdown("""
                         **Légende :**
-                        - 🔴 **Marqueurs rouges** : Postes sélectionnés
+                        - 🔴 **Marqueurs rouges** : Postes sélectionnés (regroupés en clusters au-delà de {} postes)
+                        - ⚡ **Marqueurs bleu-gris** : Tous les postes (option « Afficher tous les postes »)
                         - 🔵 **Zones bleues** : GMR (Groupements de Maintenance Régionale)
                         - 🟢 **Zones vertes** : GDP (Groupements De Postes)
-                        """)
+                        """.format(MAP_CLUSTER_THRESHOLD))
+                        
+                        with st.expander("📊 Cache des cartes", expanded=False):
+                            stats = get_map_cache().stats()
+                            st.caption(
+                                f"{stats['entries']} carte(s), {stats['size_bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} Mo — "
+                                f"{stats['hits']} hit(s), {stats['misses']} miss, {stats['evictions']} éviction(s)"
+                            )
                     else:
                         st.info("🗺️ Sélectionnez des postes dans le tableau pour afficher la carte.")
                         # Placeholder pour maintenir la hauteur de la colonne
@@ -382,11 +498,31 @@ if check_password():
                         st.markdown("<div style='height: 500px;'></div>", unsafe_allow_html=True)
                         
             else:
-                st.warning(HELP_MESSAGES['no_results'].format(search_nom))
+                if proximity_center:
+                    st.warning(HELP_MESSAGES['no_nearby'].format(proximity_query.get("radius_km", "∞")))
+                elif selection_drawings:
+                    st.warning(HELP_MESSAGES['no_drawn_postes'])
+                else:
+                    st.warning(HELP_MESSAGES['no_results'].format(search_nom))
+                    # Aucun nom ne contient ces mots : noms proches malgré les fautes de frappe
+                    fuzzy_index = postes_fuzzy_index(postes)
+                    fuzzy_matches = fuzzy_index.match(search_nom, MAX_SEARCH_SUGGESTIONS)
+                    if fuzzy_matches:
+                        st.pills(
+                            HELP_MESSAGES['did_you_mean'],
+                            [fuzzy_index.token_index.names[position] for position, _ in fuzzy_matches],
+                            key="search_correction",
+                            on_change=apply_search_suggestion,
+                            args=("search_correction",)
+                        )
                 
         except Exception as e:
             st.error(f"❌ Erreur lors de la recherche : {e}")
             
+    elif selection_mode:
+        st.info(HELP_MESSAGES['selection_no_drawing'])
+    elif proximity_mode:
+        st.info(HELP_MESSAGES['proximity_invalid'] if proximity_point else HELP_MESSAGES['proximity_no_input'])
     elif search_nom and len(search_nom.strip()) < MIN_SEARCH_LENGTH:
         st.info(HELP_MESSAGES['search_min_chars'])
     else:
@@ -0,0 +1,87 @@
+"""
+Benchmark du coût par appel des fonctions en st.cache_data : DataFrame haché contre Dataset versionné
+
+Avant : les fonctions en cache (recherches spatiales, couches de la carte) recevaient les
+DataFrames postes/GMR/GDP, que Streamlit sérialisait en entier (tous les sommets) pour construire
+la clé de cache à chaque appel. Après : elles reçoivent un datasets.Dataset haché par sa version.
+
+    python benchmarks/bench_cache_keys.py --points-per-edge 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+from streamlit import logger as streamlit_logger
+
+# Hors de `streamlit run`, chaque fonction en cache avertit de l'absence de runtime
+streamlit_logger.set_log_level('error')
+
+from benchmarks.synthetic_kml import LAT_MAX, LAT_MIN, LON_MAX, LON_MIN, write_dataset
+from src.datasets import Dataset, load_gdp_dataset, load_gmr_dataset, load_postes_dataset
+from src.map_utils import create_zones_layer, find_postes_near
+
+
+@st.cache_data
+def legacy_find_postes_near(lat, lon, postes_df, radius_km):
+    # Ancienne signature : le DataFrame fait partie de la clé de cache
+    return find_postes_near(lat, lon, Dataset('legacy-postes', postes_df), radius_km)
+
+
+@st.cache_data
+def legacy_create_zones_layer(postes_result, gmr_df, gdp_df):
+    return create_zones_layer(postes_result, Dataset('legacy-gmr', gmr_df), Dataset('legacy-gdp', gdp_df))
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--postes', type=int, default=5000)
+    parser.add_argument('--points-per-edge', type=int, default=100)
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_dataset(root, n_postes=args.postes, points_per_edge=args.points_per_edge)
+        os.chdir(root)
+        postes = load_postes_dataset()
+        gmr, gdp = load_gmr_dataset(level=None), load_gdp_dataset(level=None)
+        n_vertices = sum(len(c) for c in gdp.df['coordinates'])
+
+        rng = np.random.default_rng(0)
+        points = np.column_stack([rng.uniform(LAT_MIN, LAT_MAX, args.calls), rng.uniform(LON_MIN, LON_MAX, args.calls)])
+        selection = postes.df.head(5)
+        cases = [
+            ('find_postes_near (miss)',
+             lambda: per_call(legacy_find_postes_near, [(lat, lon, postes.df, 10) for lat, lon in points]),
+             lambda: per_call(find_postes_near, [(lat, lon, postes, 10) for lat, lon in points])),
+            ('find_postes_near (hit)',
+             lambda: per_call(legacy_find_postes_near, [(lat, lon, postes.df, 10) for lat, lon in points]),
+             lambda: per_call(find_postes_near, [(lat, lon, postes, 10) for lat, lon in points])),
+            ('create_zones_layer (hit)',
+             lambda: per_call(legacy_create_zones_layer, [(selection, gmr.df, gdp.df)] * 5),
+             lambda: per_call(create_zones_layer, [(selection, gmr, gdp)] * 5)),
+        ]
+
+        print(f"GDP : {len(gdp.df)} polygones, {n_vertices} sommets (pleine précision)")
+        print(f"{'appel':<32} {'DataFrame (ms)':>15} {'Dataset (ms)':>13} {'gain':>7}")
+        for label, legacy, versioned in cases:
+            before, after = legacy(), versioned()
+            print(f"{label:<32} {before * 1e3:>15.2f} {after * 1e3:>13.2f} {before / after:>6.0f}x")
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark du parsing KML : arbre complet (ET.parse + findall) contre streaming (iterparse)
+
+Chaque mesure tourne dans un processus neuf pour que le pic de RSS soit propre à la méthode.
+
+    python benchmarks/bench_kml_parsing.py --postes 50000 --points-per-edge 200
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LAYERS = {
+    'postes': ('Poste.kml', 'parse_postes_kml_optimized'),
+    'gmr': ('GMR.kml', 'parse_gmr_kml_optimized'),
+    'gdp': ('GDP.kml', 'parse_gdp_kml_optimized'),
+}
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux et en octets sous macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(mode, layer, root):
+    import xml.etree.ElementTree as ET
+    from src import parsers
+
+    if mode == 'tree':
+        # Ancien chemin : tout l'arbre est construit avant de parcourir les placemarks
+        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
+        parsers.iter_placemarks = lambda kml_file: ET.parse(kml_file).getroot().findall('.//kml:Placemark', ns)
+
+    os.chdir(root)
+    start = time.perf_counter()
+    df = getattr(parsers, LAYERS[layer][1])()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'rows': len(df), 'seconds': elapsed, 'peak_rss_mb': _peak_rss_mb()}))
+
+
+def measure(mode, layer, root):
+    # Pas de cache : chaque mesure doit réellement parser le KML
+    shutil.rmtree(os.path.join(root, 'data'), ignore_errors=True)
+    os.makedirs(os.path.join(root, 'data'))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode, layer, root],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--postes', type=int, default=50000)
+    parser.add_argument('--points-per-edge', type=int, default=150)
+    parser.add_argument('--worker', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    from benchmarks.synthetic_kml import write_dataset
+
+    with tempfile.TemporaryDirectory() as root:
+        write_dataset(root, n_postes=args.postes, points_per_edge=args.points_per_edge)
+        print(f"{'couche':<8} {'taille':>9} {'méthode':<10} {'lignes':>7} {'temps (s)':>10} {'pic RSS (Mo)':>13}")
+        for layer, (filename, _) in LAYERS.items():
+            size_mb = os.path.getsize(os.path.join(root, 'kml', filename)) / (1024 * 1024)
+            for mode in ('tree', 'stream'):
+                r = measure(mode, layer, root)
+                print(f"{layer:<8} {size_mb:>7.1f}Mo {mode:<10} {r['rows']:>7} {r['seconds']:>10.2f} {r['peak_rss_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
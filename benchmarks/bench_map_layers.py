@@ -0,0 +1,140 @@
+"""
+Benchmark du rendu des zones : un folium.Polygon par zone, une FeatureCollection GeoJson par couche,
+puis la même couche aux coordonnées quantifiées et encodées en polyline
+
+Avant : chaque GMR/GDP était un folium.Polygon avec son propre Popup HTML et son Tooltip,
+soit trois objets Leaflet et un bloc de HTML par zone. Après : une seule couche GeoJson,
+un style partagé et des popups/tooltips construits côté navigateur depuis les propriétés,
+dont les anneaux sont envoyés en polyline (MAP_COORDINATE_PRECISION décimales).
+Mesure le temps de construction des objets folium, le temps de rendu et la taille du HTML,
+puis les octets gagnés par couche par l'encodage.
+
+    python benchmarks/bench_map_layers.py --sub 8 --points-per-edge 60
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import folium
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_kml import grid_zones, write_zones_kml
+from src.map_utils import (
+    GDP_STYLE, GDP_TOOLTIP_FIELD, GMR_STYLE, GMR_TOOLTIP_FIELD, add_zone_layer, has_polygon, zones_feature_collection
+)
+from src.parsers import GDP_LAYER, GMR_LAYER, parse_layer
+from src.performance_config import MAP_COORDINATE_PRECISION
+
+
+def legacy_gmr_polygons(target, gmr_rows):
+    # Ancien add_gmr_polygons : un Polygon, un Popup et un Tooltip par zone
+    for idx, gmr in gmr_rows.iterrows():
+        if has_polygon(gmr.get('coordinates')):
+            popup_text = f"""
+            <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size: 13px; max-width: 280px; padding: 10px; line-height: 1.4; background-color: white; border-radius: 5px;">
+                <div style="color: #1f4e79; font-weight: bold; font-size: 15px; margin-bottom: 8px; border-bottom: 2px solid #1f4e79; padding-bottom: 4px;">
+                    &#x1F535; GMR
+                </div>
+                <div style="color: #333;">
+                    <div style="font-weight: bold; margin-bottom: 2px;">{gmr.get('GMR_alias', 'N/A')}</div>
+                    <div style="color: #666; font-size: 12px;">
+                        <span style="font-weight: 600;">Code:</span> {gmr.get('GMR', 'N/A')}<br>
+                        <span style="font-weight: 600;">Siège:</span> {gmr.get('Siège_du_', 'N/A')}
+                    </div>
+                </div>
+            </div>
+            """
+            folium.Polygon(
+                locations=gmr['coordinates'],
+                popup=folium.Popup(popup_text, max_width=320, parse_html=False),
+                color='blue', weight=2, fillColor='lightblue', fillOpacity=0.3,
+                tooltip=folium.Tooltip(f"GMR: {gmr.get('GMR_alias', 'N/A')}", sticky=False)
+            ).add_to(target)
+
+
+def legacy_gdp_polygons(target, gdp_rows):
+    # Ancien add_gdp_polygons
+    for idx, gdp in gdp_rows.iterrows():
+        if has_polygon(gdp.get('coordinates')):
+            popup_text = f"""
+            <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size: 13px; max-width: 280px; padding: 10px; line-height: 1.4; background-color: white; border-radius: 5px;">
+                <div style="color: #2d5016; font-weight: bold; font-size: 15px; margin-bottom: 8px; border-bottom: 2px solid #2d5016; padding-bottom: 4px;">
+                    &#x1F7E2; GDP
+                </div>
+                <div style="color: #333;">
+                    <div style="font-weight: bold; margin-bottom: 2px;">{gdp.get('Poste', 'N/A')}</div>
+                    <div style="color: #666; font-size: 12px;">
+                        <span style="font-weight: 600;">Code:</span> {gdp.get('Code', 'N/A')}<br>
+                        <span style="font-weight: 600;">DI:</span> {gdp.get('Nom_du_cen', 'N/A')}<br>
+                        <span style="font-weight: 600;">GMR:</span> {gdp.get('GMR', 'N/A')}
+                    </div>
+                </div>
+            </div>
+            """
+            folium.Polygon(
+                locations=gdp['coordinates'],
+                popup=folium.Popup(popup_text, max_width=320, parse_html=False),
+                color='green', weight=2, fillColor='lightgreen', fillOpacity=0.2,
+                tooltip=folium.Tooltip(f"GDP: {gdp.get('Poste', 'N/A')}", sticky=False)
+            ).add_to(target)
+
+
+def measure(add_gmr, add_gdp, gmr_df, gdp_df):
+    start = time.perf_counter()
+    m = folium.Map(location=[46.6, 1.9], zoom_start=6, prefer_canvas=True)
+    add_gmr(m, gmr_df)
+    add_gdp(m, gdp_df)
+    built = time.perf_counter()
+    html = m.get_root().render()
+    return built - start, time.perf_counter() - built, len(html.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cols', type=int, default=6)
+    parser.add_argument('--rows', type=int, default=5)
+    parser.add_argument('--sub', type=int, default=4, help="GDP par côté de GMR")
+    parser.add_argument('--points-per-edge', type=int, default=60)
+    parser.add_argument('--precision', type=int, default=MAP_COORDINATE_PRECISION, help="décimales conservées")
+    args = parser.parse_args()
+
+    gmrs, gdps = grid_zones(args.cols, args.rows, args.sub, args.points_per_edge)
+    with tempfile.TemporaryDirectory() as root:
+        layers = []
+        for spec, zones in ((GMR_LAYER, gmrs), (GDP_LAYER, gdps)):
+            path = os.path.join(root, spec.kml_filename)
+            write_zones_kml(path, zones)
+            layers.append(parse_layer(spec, path))
+    gmr_df, gdp_df = layers
+    n_vertices = sum(len(c) for df in layers for c in df['coordinates'])
+
+    def geojson_layers(precision):
+        return (lambda m, df: add_zone_layer(m, df, "GMR", GMR_TOOLTIP_FIELD, GMR_STYLE, precision),
+                lambda m, df: add_zone_layer(m, df, "GDP", GDP_TOOLTIP_FIELD, GDP_STYLE, precision))
+
+    print(f"{len(gmr_df)} GMR + {len(gdp_df)} GDP, {n_vertices} sommets")
+    print(f"{'rendu':<22} {'construction (ms)':>18} {'HTML (ms)':>10} {'taille (Ko)':>12}")
+    results = {}
+    for label, (add_gmr, add_gdp) in (('folium.Polygon', (legacy_gmr_polygons, legacy_gdp_polygons)),
+                                      ('GeoJson par couche', geojson_layers(None)),
+                                      (f'polyline ({args.precision} déc.)', geojson_layers(args.precision))):
+        build, render, size = results[label] = measure(add_gmr, add_gdp, gmr_df, gdp_df)
+        print(f"{label:<22} {build * 1e3:>18.1f} {render * 1e3:>10.1f} {size / 1024:>12.0f}")
+    (b0, r0, s0), *_, (b1, r1, s1) = results.values()
+    print(f"{'gain total':<22} {b0 / b1:>17.1f}x {r0 / r1:>9.1f}x {s0 / s1:>11.1f}x")
+
+    print(f"\n{'couche':<8} {'GeoJSON (Ko)':>13} {'polyline (Ko)':>14} {'gagnés (Ko)':>12} {'octets/sommet':>14}")
+    for kind, field, df in (('GMR', GMR_TOOLTIP_FIELD, gmr_df), ('GDP', GDP_TOOLTIP_FIELD, gdp_df)):
+        vertices = sum(len(c) for c in df['coordinates'])
+        plain = len(json.dumps(zones_feature_collection(df, kind, field, None)))
+        encoded = len(json.dumps(zones_feature_collection(df, kind, field, args.precision)))
+        print(f"{kind:<8} {plain / 1024:>13.0f} {encoded / 1024:>14.0f} {(plain - encoded) / 1024:>12.0f} "
+              f"{plain / vertices:>6.1f} -> {encoded / vertices:<5.1f}")
+
+
+if __name__ == '__main__':
+    main()
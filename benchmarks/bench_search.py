@@ -0,0 +1,163 @@
+"""
+Benchmark de la recherche de postes par nom : parcours de tous les noms contre index inversé
+
+Avant : chaque recherche appliquait un test d'inclusion d'ensembles (tokens de la requête ⊆ tokens
+du nom) à toutes les lignes du DataFrame, et la clé de cache hachait le DataFrame entier.
+Après : search_index.TokenIndex, construit une fois au chargement des postes, intersecte les
+listes de positions des tokens de la requête ; le coût dépend de la taille des résultats.
+Mesure aussi la saisie partielle : dernier mot traité comme préfixe (plage des tokens triés,
+trouvée par bisect) et suggestions de complétion, contre un parcours de tous les noms ; puis
+les noms mal orthographiés : difflib.get_close_matches (ancienne page Planning) contre FuzzyIndex.
+
+    python benchmarks/bench_search.py --postes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from difflib import get_close_matches
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_kml import write_postes_kml
+from src.parsers import POSTES_LAYER, parse_layer
+from src.performance_config import FUZZY_MATCH_CUTOFF
+from src.search_index import FuzzyIndex, TokenIndex, clean_and_split, split_query
+
+
+def legacy_search(search_df, search_nom):
+    # Ancien search_postes : test d'inclusion sur chaque ligne
+    search_words = set(clean_and_split(search_nom))
+    return np.flatnonzero(search_df["_nom_clean_list"].apply(lambda x: search_words <= set(x)).to_numpy())
+
+
+def prefix_scan(search_df, search_nom):
+    # Saisie partielle sans index : mots complets inclus et un token commençant par le dernier mot
+    tokens, last = split_query(search_nom)
+    words = set(tokens)
+    return np.flatnonzero(search_df["_nom_clean_list"].apply(
+        lambda x: words <= set(x) and any(t.startswith(last) for t in x)).to_numpy())
+
+
+def partial_inputs(queries, seed=0):
+    # Saisies en cours de frappe : le dernier mot tronqué (au moins 2 caractères)
+    rng = random.Random(seed)
+    partial = []
+    for query in queries:
+        words = query.split()
+        last = words[-1]
+        words[-1] = last[:rng.randint(min(2, len(last)), len(last))]
+        partial.append(" ".join(words))
+    return partial
+
+
+def misspell(name, rng):
+    # Une faute de frappe : lettre supprimée, remplacée ou deux lettres inversées
+    i = rng.randrange(len(name) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i + 1:]
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def sample_queries(names, n_queries, seed=0):
+    # Noms complets, un seul token (fréquent ou rare), deux tokens et requêtes sans résultat
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n_queries):
+        tokens = clean_and_split(rng.choice(names))
+        kind = i % 4
+        if kind == 0:
+            queries.append(rng.choice(names))
+        elif kind == 1:
+            queries.append(rng.choice(tokens))
+        elif kind == 2:
+            queries.append(" ".join(rng.sample(tokens, min(2, len(tokens)))))
+        else:
+            queries.append(f"{tokens[0]} introuvable")
+    return queries
+
+
+def timed(func, queries):
+    start = time.perf_counter()
+    result = [func(query) for query in queries]
+    return result, (time.perf_counter() - start) / max(len(queries), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--postes', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--difflib-queries', type=int, default=5, help="difflib parcourt tous les noms : peu de requêtes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, POSTES_LAYER.kml_filename)
+        write_postes_kml(path, args.postes)
+        postes_df = parse_layer(POSTES_LAYER, path)
+    names = postes_df['Nom_du_pos'].tolist()
+    queries = sample_queries(names, args.queries)
+
+    start = time.perf_counter()
+    search_df = postes_df.copy()
+    search_df["_nom_clean_list"] = search_df['Nom_du_pos'].apply(clean_and_split)
+    legacy_build = time.perf_counter() - start
+    start = time.perf_counter()
+    index = TokenIndex(names)
+    index_build = time.perf_counter() - start
+
+    expected, scan = timed(lambda query: legacy_search(search_df, query), queries)
+    found, lookup = timed(index.query, queries)
+    mismatches = sum(not np.array_equal(a, b) for a, b in zip(expected, found))
+    sizes = np.array([len(r) for r in found])
+
+    print(f"{len(postes_df)} postes, {len(index.postings)} tokens, {len(queries)} requêtes "
+          f"({sizes.mean():.0f} résultats en moyenne, {sizes.max()} au plus)")
+    print(f"{'méthode':<16} {'préparation (ms)':>17} {'requête (µs)':>13}")
+    print(f"{'parcours':<16} {legacy_build * 1e3:>17.0f} {scan * 1e6:>13.0f}")
+    print(f"{'index inversé':<16} {index_build * 1e3:>17.0f} {lookup * 1e6:>13.0f}")
+    print(f"gain par requête : {scan / lookup:.0f}x, écarts : {mismatches}")
+
+    partial = [query for query in partial_inputs(queries) if split_query(query)[1]]
+    expected, scan = timed(lambda query: prefix_scan(search_df, query), partial)
+    found, lookup = timed(lambda query: index.query(query, prefix=True), partial)
+    _, suggest = timed(index.suggest, partial)
+    mismatches = sum(not np.array_equal(a, b) for a, b in zip(expected, found))
+    sizes = np.array([len(r) for r in found])
+    print(f"\n{len(partial)} saisies partielles ({sizes.mean():.0f} résultats en moyenne, {sizes.max()} au plus)")
+    print(f"{'méthode':<16} {'requête (µs)':>13}")
+    print(f"{'parcours':<16} {scan * 1e6:>13.0f}")
+    print(f"{'préfixe (bisect)':<16} {lookup * 1e6:>13.0f}")
+    print(f"{'suggestions':<16} {suggest * 1e6:>13.0f}")
+    print(f"gain par requête : {scan / lookup:.0f}x, écarts : {mismatches}")
+
+    rng = random.Random(1)
+    targets = [rng.choice(names) for _ in range(args.queries)]
+    typos = [misspell(name, rng) for name in targets]
+    start = time.perf_counter()
+    fuzzy = FuzzyIndex(index)
+    fuzzy_build = time.perf_counter() - start
+    lowered = [str(name).strip().lower() for name in names]
+    expected, scan = timed(lambda query: get_close_matches(query.lower(), lowered, n=1, cutoff=FUZZY_MATCH_CUTOFF),
+                           typos[:args.difflib_queries])
+    found, lookup = timed(fuzzy.best, typos)
+    # Retrouvé : le nom proposé a les mêmes tokens normalisés que le nom d'origine
+    same = [clean_and_split(target) == clean_and_split(names[pos]) if pos is not None else False
+            for target, pos in zip(targets, found)]
+    same_difflib = [bool(match) and clean_and_split(target) == clean_and_split(match[0])
+                    for target, match in zip(targets, expected)]
+    print(f"\n{len(typos)} noms avec une faute de frappe (difflib sur les {len(expected)} premiers)")
+    print(f"{'méthode':<16} {'préparation (ms)':>17} {'requête (µs)':>13} {'retrouvés':>10}")
+    print(f"{'difflib':<16} {0:>17.0f} {scan * 1e6:>13.0f} {np.mean(same_difflib):>9.0%}")
+    print(f"{'trigrammes':<16} {fuzzy_build * 1e3:>17.0f} {lookup * 1e6:>13.0f} {np.mean(same):>9.0%}")
+    print(f"gain par requête : {scan / lookup:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
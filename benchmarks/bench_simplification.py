@@ -0,0 +1,108 @@
+"""
+Benchmark de la simplification des polygones GDP : décimation 1 sommet sur N contre Douglas-Peucker
+
+Compare, par rapport à la pleine précision : nombre de sommets, GDP attribué à des points
+proches des frontières (précision de l'appartenance) et temps de construction.
+
+    python benchmarks/bench_simplification.py --points-per-edge 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_kml import grid_zones, write_zones_kml
+from src.geo_cache import buffers_to_rings, compute_levels, rings_to_buffers
+from src.parsers import GDP_LAYER, parse_layer
+from src.performance_config import POLYGON_LOD_TOLERANCES
+
+
+def legacy_decimation(coords):
+    # Ancien chemin non HQ : un sommet sur N selon la taille du polygone
+    n = len(coords)
+    if n <= 100:
+        step = 1
+    elif n <= 500:
+        step = max(1, n // 200)
+    elif n <= 2000:
+        step = max(1, n // 300)
+    else:
+        step = max(1, n // 400)
+    return coords[::step]
+
+
+def _contains(points, ring):
+    # Ray casting vectorisé sur un lot de points (lat, lon)
+    lat, lon = points[:, 0][:, None], points[:, 1][:, None]
+    y1, x1 = ring[:-1, 0][None, :], ring[:-1, 1][None, :]
+    y2, x2 = ring[1:, 0][None, :], ring[1:, 1][None, :]
+    crosses = (y1 > lat) != (y2 > lat)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_inter = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+    return (crosses & (lon < x_inter)).sum(axis=1) % 2 == 1
+
+
+def locate(points, rings):
+    """Indice du premier polygone contenant chaque point (-1 si aucun)"""
+    result = np.full(len(points), -1)
+    for i, ring in enumerate(rings):
+        lo, hi = ring.min(axis=0), ring.max(axis=0)
+        candidates = np.flatnonzero((result < 0) & (points >= lo).all(axis=1) & (points <= hi).all(axis=1))
+        if len(candidates):
+            result[candidates[_contains(points[candidates], ring)]] = i
+    return result
+
+
+def boundary_points(rings, n_points, jitter_m, seed=0):
+    # Points tirés près des frontières : sommets réels décalés de quelques centaines de mètres
+    rng = np.random.default_rng(seed)
+    coords = np.concatenate(rings)
+    picked = coords[rng.integers(0, len(coords), n_points)]
+    return picked + rng.normal(0, jitter_m / 111_320.0, picked.shape)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points-per-edge', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--jitter', type=float, default=300.0, help="écart-type en mètres autour des frontières")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'GDP.kml')
+        write_zones_kml(path, grid_zones(6, 5, 4, args.points_per_edge)[1])
+        full = [np.asarray(r) for r in parse_layer(GDP_LAYER, path)['coordinates']]
+
+    points = boundary_points(full, args.samples, args.jitter)
+    reference = locate(points, full)
+    n_full = sum(len(r) for r in full)
+
+    start = time.perf_counter()
+    stride = [legacy_decimation(r) for r in full]
+    variants = [('décimation 1/N', stride, time.perf_counter() - start)]
+
+    coords, offsets = rings_to_buffers(full)
+    start = time.perf_counter()
+    _, levels = compute_levels(coords, offsets, POLYGON_LOD_TOLERANCES)
+    build = time.perf_counter() - start
+    for name, (level_coords, level_offsets) in levels.items():
+        tolerance = POLYGON_LOD_TOLERANCES[name]
+        variants.append((f'DP {name} ({tolerance} m)', buffers_to_rings(level_coords, level_offsets), build))
+
+    print(f"{len(full)} polygones, {n_full} sommets, {args.samples} points à ~{args.jitter:.0f} m des frontières")
+    print(f"{'méthode':<22} {'sommets':>9} {'% gardés':>9} {'GDP correct':>12} {'construction (s)':>17}")
+    print(f"{'pleine précision':<22} {n_full:>9} {100.0:>8.1f}% {100.0:>11.2f}% {'-':>17}")
+    for name, rings, seconds in variants:
+        n = sum(len(r) for r in rings)
+        accuracy = (locate(points, rings) == reference).mean() * 100
+        print(f"{name:<22} {n:>9} {100 * n / n_full:>8.1f}% {accuracy:>11.2f}% {seconds:>17.3f}")
+    print("(la construction DP calcule en une passe tous les niveaux de détail)")
+
+
+if __name__ == '__main__':
+    main()
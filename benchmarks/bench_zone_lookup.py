@@ -0,0 +1,86 @@
+"""
+Benchmark de la recherche du GMR/GDP d'un poste : parcours iterrows contre R-tree (STR)
+
+Compare, pour des points tirés au hasard, l'ancien parcours linéaire de toutes les zones
+(find_gmr_for_poste / find_gdp_for_poste) et la recherche par R-tree qui ne lance le ray
+casting que sur les zones dont la boîte englobante contient le point. La dernière ligne
+compare la recherche du couple (GMR, GDP) par deux R-tree et par la hiérarchie GMR → GDP.
+
+    python benchmarks/bench_zone_lookup.py --sub 8 --lookups 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_kml import LAT_MAX, LAT_MIN, LON_MAX, LON_MIN, grid_zones, write_zones_kml
+from src.parsers import GDP_LAYER, GMR_LAYER, parse_layer
+from src.spatial import ZoneHierarchy, ZoneIndex, points_in_polygon
+
+
+def iterrows_scan(lat, lon, zones_df):
+    # Ancien find_gmr_for_poste / find_gdp_for_poste, sans le cache Streamlit
+    for pos, (_, zone) in enumerate(zones_df.iterrows()):
+        coords = zone.get('coordinates')
+        if isinstance(coords, (list, np.ndarray)) and len(coords) > 2 and points_in_polygon(lat, lon, coords)[0]:
+            return pos
+    return -1
+
+
+def timed(func, points):
+    start = time.perf_counter()
+    result = [func(lat, lon) for lat, lon in points]
+    return np.array(result), (time.perf_counter() - start) / len(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cols', type=int, default=6)
+    parser.add_argument('--rows', type=int, default=5)
+    parser.add_argument('--sub', type=int, default=4, help="GDP par côté de GMR")
+    parser.add_argument('--points-per-edge', type=int, default=60)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    gmrs, gdps = grid_zones(args.cols, args.rows, args.sub, args.points_per_edge)
+    with tempfile.TemporaryDirectory() as root:
+        layers = []
+        for spec, zones in ((GMR_LAYER, gmrs), (GDP_LAYER, gdps)):
+            path = os.path.join(root, spec.kml_filename)
+            write_zones_kml(path, zones)
+            layers.append((spec.kml_filename, parse_layer(spec, path)))
+
+    rng = np.random.default_rng(0)
+    points = np.column_stack([rng.uniform(LAT_MIN, LAT_MAX, args.lookups), rng.uniform(LON_MIN, LON_MAX, args.lookups)])
+
+    print(f"{args.lookups} recherches, points uniformes sur l'emprise")
+    print(f"{'couche':<10} {'zones':>6} {'index (ms)':>11} {'iterrows (µs)':>14} {'R-tree (µs)':>12} {'gain':>7} {'écarts':>7}")
+    indexes = []
+    for name, zones_df in layers:
+        start = time.perf_counter()
+        index = ZoneIndex(zones_df)
+        build = time.perf_counter() - start
+        expected, scan = timed(lambda lat, lon: iterrows_scan(lat, lon, zones_df), points)
+        found, lookup = timed(index.locate, points)
+        indexes.append(index)
+        print(f"{name:<10} {len(zones_df):>6} {build * 1e3:>11.1f} {scan * 1e6:>14.0f} {lookup * 1e6:>12.0f} "
+              f"{scan / lookup:>6.0f}x {int((found != expected).sum()):>7}")
+
+    gmr_index, gdp_index = indexes
+    start = time.perf_counter()
+    hierarchy = ZoneHierarchy(layers[0][1], layers[1][1])
+    build = time.perf_counter() - start
+    expected, separate = timed(lambda lat, lon: (gmr_index.locate(lat, lon), gdp_index.locate(lat, lon)), points)
+    found, combined = timed(hierarchy.locate, points)
+    print(f"\n{'GMR + GDP':<10} {'':>6} {'hiérarchie (ms)':>15} {'2 R-tree (µs)':>14} {'hiérarchie (µs)':>16} {'gain':>7} {'écarts':>7}")
+    print(f"{'':<10} {'':>6} {build * 1e3:>15.1f} {separate * 1e6:>14.0f} {combined * 1e6:>16.0f} "
+          f"{separate / combined:>6.1f}x {int((found != expected).any(axis=1).sum()):>7}")
+
+
+if __name__ == '__main__':
+    main()
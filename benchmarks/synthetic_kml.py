@@ -0,0 +1,119 @@
+"""
+Génération de fichiers KML synthétiques (Poste, GMR, GDP) pour les benchmarks
+"""
+import math
+import os
+import random
+from xml.sax.saxutils import escape
+
+# Emprise approximative de la France métropolitaine
+LAT_MIN, LAT_MAX = 42.3, 51.0
+LON_MIN, LON_MAX = -4.8, 8.2
+
+KML_HEADER = '<?xml version="1.0" encoding="utf-8" ?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document><Folder>\n'
+KML_FOOTER = '</Folder></Document></kml>\n'
+
+
+def _schema_data(fields):
+    items = ''.join(f'<SimpleData name="{name}">{escape(str(value))}</SimpleData>' for name, value in fields.items())
+    return f'<ExtendedData><SchemaData schemaUrl="#layer">{items}</SchemaData></ExtendedData>'
+
+
+def _coords_text(ring):
+    return ' '.join(f'{lon:.7f},{lat:.7f}' for lat, lon in ring)
+
+
+def write_postes_kml(path, n_postes, seed=0):
+    """Écrit un Poste.kml de n_postes points répartis sur la France"""
+    rng = random.Random(seed)
+    syllables = ['sou', 'llans', 'mar', 'tyre', 'ker', 'vil', 'lers', 'bois', 'mont', 'val', 'ro', 'che', 'gre', 'nay']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(KML_HEADER)
+        for i in range(n_postes):
+            name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+            if rng.random() < 0.3:
+                name = f"{rng.choice(['La', 'Le', 'Les'])} {name}"
+            if rng.random() < 0.2:
+                name = f"{name}-{rng.choice(syllables).capitalize()}"
+            fields = {
+                'Nom_du_pos': name,
+                'Identifian': f'P{i:06d}',
+                'Tension_d': rng.choice(['63kV', '90kV', '225kV', '400kV']),
+                'Tension_00': rng.choice(['20kV', '63kV', '']),
+                'Commentaire': 'x' * 40,
+            }
+            lat = rng.uniform(LAT_MIN, LAT_MAX)
+            lon = rng.uniform(LON_MIN, LON_MAX)
+            f.write(f'<Placemark>{_schema_data(fields)}<Point><coordinates>{lon:.7f},{lat:.7f}</coordinates></Point></Placemark>\n')
+        f.write(KML_FOOTER)
+
+
+def _wavy_edge(fixed, start, end, n_points, cell, amplitude, horizontal):
+    # Bord ondulé dont la perturbation ne dépend que de la position globale :
+    # deux zones voisines partagent donc exactement la même frontière
+    ring = []
+    for k in range(n_points):
+        t = start + (end - start) * k / n_points
+        u = (t - (LON_MIN if horizontal else LAT_MIN)) / cell
+        # Harmoniques entières : la perturbation s'annule aux coins de toutes les cellules
+        offset = amplitude * (math.sin(math.pi * 3 * u) + 0.2 * math.sin(math.pi * 29 * u) + 0.05 * math.sin(math.pi * 157 * u))
+        ring.append((fixed + offset, t) if horizontal else (t, fixed + offset))
+    return ring
+
+
+def grid_zones(n_cols, n_rows, sub, points_per_edge, amplitude=0.02):
+    """Découpe la France en n_cols x n_rows GMR, chacun subdivisé en sub x sub GDP aux frontières ondulées"""
+    gmr_w = (LON_MAX - LON_MIN) / n_cols
+    gmr_h = (LAT_MAX - LAT_MIN) / n_rows
+    gdp_w, gdp_h = gmr_w / sub, gmr_h / sub
+
+    def cell_ring(lon0, lat0, nx, ny):
+        # Anneau [lat, lon] d'un rectangle de nx x ny cellules GDP
+        ring = []
+        for i in range(nx):
+            ring += _wavy_edge(lat0, lon0 + i * gdp_w, lon0 + (i + 1) * gdp_w, points_per_edge, gdp_w, amplitude, True)
+        for j in range(ny):
+            ring += _wavy_edge(lon0 + nx * gdp_w, lat0 + j * gdp_h, lat0 + (j + 1) * gdp_h, points_per_edge, gdp_h, amplitude, False)
+        for i in reversed(range(nx)):
+            ring += _wavy_edge(lat0 + ny * gdp_h, lon0 + (i + 1) * gdp_w, lon0 + i * gdp_w, points_per_edge, gdp_w, amplitude, True)
+        for j in reversed(range(ny)):
+            ring += _wavy_edge(lon0, lat0 + (j + 1) * gdp_h, lat0 + j * gdp_h, points_per_edge, gdp_h, amplitude, False)
+        ring.append(ring[0])
+        return ring
+
+    gmrs, gdps = [], []
+    for c in range(n_cols):
+        for r in range(n_rows):
+            code = f'GMR{c:02d}{r:02d}'
+            lon0, lat0 = LON_MIN + c * gmr_w, LAT_MIN + r * gmr_h
+            gmrs.append(({'GMR': code, 'GMR_alias': f'GMR {c}-{r}', 'Siège_du_': f'Siège {c}-{r}'},
+                         cell_ring(lon0, lat0, sub, sub)))
+            for i in range(sub):
+                for j in range(sub):
+                    gdps.append(({'Poste': f'GDP {c}-{r}-{i}-{j}', 'Code': f'{code}{i}{j}',
+                                  'Nom_du_cen': f'DI {c}', 'GMR': code},
+                                 cell_ring(lon0 + i * gdp_w, lat0 + j * gdp_h, 1, 1)))
+    return gmrs, gdps
+
+
+def write_zones_kml(path, zones, multigeometry=False):
+    """Écrit un KML de polygones (GMR.kml ou GDP.kml) à partir de (attributs, anneau [lat, lon])"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(KML_HEADER)
+        for fields, ring in zones:
+            polygon = f'<Polygon><outerBoundaryIs><LinearRing><coordinates>{_coords_text(ring)}</coordinates></LinearRing></outerBoundaryIs></Polygon>'
+            if multigeometry:
+                polygon = f'<MultiGeometry>{polygon}</MultiGeometry>'
+            f.write(f'<Placemark>{_schema_data(fields)}{polygon}</Placemark>\n')
+        f.write(KML_FOOTER)
+
+
+def write_dataset(root, n_postes=20000, n_cols=6, n_rows=5, sub=4, points_per_edge=60):
+    """Crée root/kml/{Poste,GMR,GDP}.kml et root/data/ : arborescence attendue par src.config"""
+    os.makedirs(os.path.join(root, 'kml'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'data'), exist_ok=True)
+    gmrs, gdps = grid_zones(n_cols, n_rows, sub, points_per_edge)
+    write_postes_kml(os.path.join(root, 'kml', 'Poste.kml'), n_postes)
+    write_zones_kml(os.path.join(root, 'kml', 'GMR.kml'), gmrs)
+    write_zones_kml(os.path.join(root, 'kml', 'GDP.kml'), gdps, multigeometry=True)
+    return root
@@ -0,0 +1,84 @@
+"""
+Précalcul hors ligne de tous les caches de data/ à partir des fichiers de kml/
+
+À lancer après chaque mise à jour des KML (ou dans l'étape de build du déploiement) :
+l'application ne fait alors plus que charger des fichiers prêts à l'emploi.
+
+    python build_cache.py [--workers 4]
+
+Les index spatiaux (R-tree STR des zones, hiérarchie GMR → GDP, KD-tree des postes) ne sont pas
+écrits dans data/ : chaque processus de l'application les reconstruit en mémoire au premier usage,
+à partir des boîtes englobantes et des arêtes persistées ici dans le cache géométrique, puis les
+garde tant que le jeu de données est chargé (une fraction de seconde au total).
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.cache_manifest import read_manifest
+from src.config import get_cache_path, get_static_path
+from src.parsers import POSTES_LAYER, GMR_LAYER, GDP_LAYER, layer_artifact
+from src.spatial import zones_artifact
+from src.static_layers import STATIC_POSTES_DIR, STATIC_ZONES_DIR, build_static_postes_layer, build_static_zone_layers
+
+# Étapes regroupées par vague : les étapes d'une même vague sont indépendantes
+# et tournent en parallèle, chaque vague attend la précédente
+BUILD_STAGES = [
+    [
+        ("Postes", layer_artifact, (POSTES_LAYER,)),
+        ("GMR (tous niveaux de détail)", layer_artifact, (GMR_LAYER,)),
+        ("GDP (tous niveaux de détail)", layer_artifact, (GDP_LAYER,)),
+    ],
+    [
+        ("Affectation postes → GMR/GDP", zones_artifact, ()),
+        ("Couches statiques GMR/GDP", build_static_zone_layers, ()),
+        ("Couche statique des postes", build_static_postes_layer, ()),
+    ],
+]
+
+
+def run_step(func, step_args):
+    start = time.perf_counter()
+    artifact = func(*step_args)
+    return artifact, time.perf_counter() - start
+
+
+def clear_artifacts():
+    """Supprime tous les artefacts référencés par le manifeste et les couches statiques (reconstruction complète)"""
+    for key in read_manifest()["artifacts"]:
+        shutil.rmtree(get_cache_path(key), ignore_errors=True)
+    for directory in (STATIC_ZONES_DIR, STATIC_POSTES_DIR):
+        shutil.rmtree(get_static_path(directory), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="nombre de processus (défaut : nombre de CPU)")
+    parser.add_argument("--force", action="store_true", help="reconstruire même si les caches sont à jour")
+    args = parser.parse_args()
+
+    print("🍔 BURGER - Construction des caches")
+    print("=" * 50)
+    if args.force:
+        clear_artifacts()
+
+    total_start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for stage in BUILD_STAGES:
+            futures = [(label, pool.submit(run_step, func, step_args)) for label, func, step_args in stage]
+            for label, future in futures:
+                try:
+                    artifact, seconds = future.result()
+                    print(f"✅ {label:<32} {seconds:6.1f} s  → {artifact}")
+                except Exception as e:
+                    failures += 1
+                    print(f"❌ {label:<32} {e}")
+    print(f"Terminé en {time.perf_counter() - total_start:.1f} s")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from src.user_utils import get_user_mail, get_all_users_mails
-from src.parsers import parse_postes_kml_optimized, parse_gdp_kml_optimized
-from src.map_utils import find_gdp_for_poste
-from difflib import get_close_matches
+from src.datasets import load_postes_dataset
+from src.parsers import parse_gdp_kml_optimized
+from src.map_utils import poste_zone_positions
+from src.search_index import postes_fuzzy_index
+from src.spatial import zone_row
 from src.auth import check_password
 
 # Configuration de la page - doit être en premier
@@ -34,83 +36,49 @@ if check_password():
     uploaded_file = st.file_uploader("Importer le planning CSV", type=["csv"])
 
     # Cache des postes et GDP pour éviter de recharger à chaque fois
-    @st.cache_data
+    @st.cache_resource
     def load_postes_data():
-        """Charge les données des postes depuis Poste.kml"""
-        return parse_postes_kml_optimized()
+        """Charge les données des postes depuis Poste.kml (avec leur GDP précalculé)"""
+        return load_postes_dataset()
     
-    @st.cache_data
+    @st.cache_resource
     def load_gdp_data():
         """Charge les données des GDP depuis GDP.kml"""
         return parse_gdp_kml_optimized()
 
+    def find_poste(nom_poste):
+        """Ligne du poste (DataFrame d'une ligne) : nom exact d'abord, sinon le nom le plus proche (index trigrammes partagé avec la recherche)"""
+        postes = load_postes_data()
+        if postes.df.empty:
+            return None
+        position = postes_fuzzy_index(postes).best(nom_poste)
+        return None if position is None else postes.df.iloc[[position]]
+
     def get_gdp_for_poste(nom_poste):
         """Recherche le GDP correspondant au poste"""
-        postes_df = load_postes_data()
         gdp_df = load_gdp_data()
-        
-        if postes_df.empty or gdp_df.empty:
+        if gdp_df.empty:
             return None
         
-        # Nettoyage du nom recherché
-        nom_poste_clean = str(nom_poste).strip().lower()
-        
-        # Recherche exacte du poste d'abord
-        poste_exact = postes_df[postes_df["Nom_du_pos"].str.strip().str.lower() == nom_poste_clean]
-        if not poste_exact.empty:
-            lat = poste_exact.iloc[0].get("latitude", None)
-            lon = poste_exact.iloc[0].get("longitude", None)
-            if lat and lon:
-                # Trouver le GDP qui contient ce poste
-                gdp_info = find_gdp_for_poste(float(lat), float(lon), gdp_df)
-                return gdp_info
-        
-        # Recherche approximative si pas de correspondance exacte
-        noms_disponibles = postes_df["Nom_du_pos"].astype(str).str.strip().str.lower().tolist()
-        matches = get_close_matches(nom_poste_clean, noms_disponibles, n=1, cutoff=0.4)
-        
-        if matches:
-            poste = postes_df[postes_df["Nom_du_pos"].str.strip().str.lower() == matches[0]]
-            if not poste.empty:
-                lat = poste.iloc[0].get("latitude", None)
-                lon = poste.iloc[0].get("longitude", None)
-                if lat and lon:
-                    gdp_info = find_gdp_for_poste(float(lat), float(lon), gdp_df)
-                    return gdp_info
-        
-        return None
+        poste = find_poste(nom_poste)
+        if poste is None:
+            return None
+        # GDP qui contient ce poste : jointure précalculée, sinon calcul à la volée (jointure indisponible)
+        return zone_row(gdp_df, poste_zone_positions(poste, "gdp_idx", gdp_df)[0])
 
     def get_poste_coords(nom_poste):
         """Recherche les coordonnées d'un poste dans le fichier Poste.kml"""
-        postes_df = load_postes_data()
-        
-        if postes_df.empty:
+        if load_postes_data().df.empty:
             st.error("Impossible de charger les données de Poste.kml")
             return None, None
         
-        # Nettoyage du nom recherché
-        nom_poste_clean = str(nom_poste).strip().lower()
-        
-        # Recherche exacte d'abord
-        poste_exact = postes_df[postes_df["Nom_du_pos"].str.strip().str.lower() == nom_poste_clean]
-        if not poste_exact.empty:
-            lat = poste_exact.iloc[0].get("latitude", None)
-            lon = poste_exact.iloc[0].get("longitude", None)
-            if lat and lon:
+        poste = find_poste(nom_poste)
+        if poste is not None:
+            lat = poste.iloc[0].get("latitude", None)
+            lon = poste.iloc[0].get("longitude", None)
+            if pd.notna(lat) and pd.notna(lon):
                 return float(lat), float(lon)
         
-        # Recherche approximative si pas de correspondance exacte
-        noms_disponibles = postes_df["Nom_du_pos"].astype(str).str.strip().str.lower().tolist()
-        matches = get_close_matches(nom_poste_clean, noms_disponibles, n=1, cutoff=0.4)
-        
-        if matches:
-            poste = postes_df[postes_df["Nom_du_pos"].str.strip().str.lower() == matches[0]]
-            if not poste.empty:
-                lat = poste.iloc[0].get("latitude", None)
-                lon = poste.iloc[0].get("longitude", None)
-                if lat and lon:
-                    return float(lat), float(lon)
-        
         return None, None
 
     def send_mail(to_email, subject, body):
@@ -0,0 +1,162 @@
+"""
+Manifeste des caches de data/ : artefacts adressés par contenu, écritures atomiques et verrou de construction
+
+Chaque artefact (dossier de data/) est identifié par le hash du contenu de ses KML sources
+et par ses paramètres (version du parser, niveaux de détail...). Un changement de mtime
+(git checkout, rsync) ne déclenche donc qu'un re-hash du fichier, jamais un re-parsing.
+Les artefacts sont construits dans un dossier temporaire puis renommés : un processus
+tué en cours d'écriture ne laisse jamais de cache tronqué. Un verrou fichier garantit
+qu'un artefact manquant n'est construit qu'une fois quand plusieurs workers démarrent.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from .config import get_cache_path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Verrou exclusif inter-processus, libéré par l'OS si le processus meurt"""
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_text(path, text):
+    """Écrit un fichier texte via un fichier temporaire renommé (jamais de fichier à moitié écrit)"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _manifest_path():
+    return get_cache_path(MANIFEST_FILE)
+
+
+def read_manifest():
+    """Contenu du manifeste (vide s'il est absent ou illisible)"""
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") == MANIFEST_FORMAT_VERSION:
+            return manifest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Manifeste de cache illisible, il sera recréé : {e}")
+    return {"format_version": MANIFEST_FORMAT_VERSION, "sources": {}, "artifacts": {}}
+
+
+@contextmanager
+def _edit_manifest():
+    # Lecture-modification-écriture du manifeste sous verrou
+    with file_lock(_manifest_path() + ".lock"):
+        manifest = read_manifest()
+        yield manifest
+        atomic_write_text(_manifest_path(), json.dumps(manifest, indent=2, ensure_ascii=False))
+
+
+def content_hash(path, manifest=None):
+    """SHA-256 du fichier, recalculé seulement si sa taille ou son mtime ont changé depuis le dernier calcul"""
+    stat = os.stat(path)
+    known = (manifest or read_manifest())["sources"].get(path)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["sha256"]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    try:
+        with _edit_manifest() as m:
+            m["sources"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+    except OSError as e:
+        print(f"Impossible de mettre à jour le manifeste de cache : {e}")
+    return sha256
+
+
+def artifact_key(name, source_hashes, params):
+    """Identifiant d'un artefact : nom + hash des sources et des paramètres de construction"""
+    payload = json.dumps({"sources": source_hashes, "params": params}, sort_keys=True)
+    return f"{name}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+def ensure_artifact(name, sources, params, build):
+    """Retourne le dossier de l'artefact à jour, en le construisant une seule fois s'il manque
+
+    sources : fichiers dont le contenu détermine l'artefact (KML)
+    params : paramètres de construction sérialisables en JSON (version du parser, niveaux...)
+    build : fonction build(dossier) qui écrit l'artefact dans le dossier donné
+    """
+    manifest = read_manifest()
+    source_hashes = {path: content_hash(path, manifest) for path in sources}
+    key = artifact_key(name, source_hashes, params)
+    artifact_dir = get_cache_path(key)
+    if os.path.isdir(artifact_dir):
+        return artifact_dir
+
+    with file_lock(get_cache_path(f"{name}.lock")):
+        # Un autre worker a pu construire l'artefact pendant que l'on attendait le verrou
+        if os.path.isdir(artifact_dir):
+            return artifact_dir
+        # Restes d'une construction interrompue (processus tué) : personne d'autre ne peut les utiliser
+        for leftover in glob.glob(get_cache_path(f".tmp-{key}-*")):
+            shutil.rmtree(leftover, ignore_errors=True)
+        tmp_dir = get_cache_path(f".tmp-{key}-{os.getpid()}")
+        try:
+            build(tmp_dir)
+            os.replace(tmp_dir, artifact_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    try:
+        with _edit_manifest() as m:
+            # Les anciennes versions du même artefact ne sont plus référencées
+            for old_key, entry in list(m["artifacts"].items()):
+                if entry.get("name") == name and old_key != key:
+                    shutil.rmtree(get_cache_path(old_key), ignore_errors=True)
+                    del m["artifacts"][old_key]
+            m["artifacts"][key] = {
+                "name": name,
+                "sources": source_hashes,
+                "params": params,
+                "created": datetime.now().isoformat(timespec="seconds"),
+            }
+    except OSError as e:
+        print(f"Impossible de mettre à jour le manifeste de cache : {e}")
+    return artifact_dir
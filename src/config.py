@@ -6,6 +6,7 @@ import streamlit as st
 
 KML_DIR = "kml"
 CACHE_DIR = "data"
+STATIC_DIR = "static"  # Servi par Streamlit sous app/static/ (server.enableStaticServing)
 
 def get_mongodb_url():
     # Récupère l'URL MongoDB depuis différentes sources
@@ -32,3 +33,12 @@ def get_kml_path(filename):
 def get_cache_path(filename):
     # Retourne le chemin complet d'un fichier de cache dans le dossier data
     return os.path.join(CACHE_DIR, filename)
+
+def get_static_path(filename):
+    # Retourne le chemin complet d'un fichier du dossier static servi par Streamlit
+    return os.path.join(STATIC_DIR, filename)
+
+def get_static_url(filename):
+    # Retourne l'URL absolue d'un fichier de static/, en tenant compte de server.baseUrlPath
+    base = (st.get_option("server.baseUrlPath") or "").strip("/")
+    return "/" + "/".join(part for part in (base, "app", "static", filename) if part)
@@ -0,0 +1,55 @@
+"""
+Jeux de données chargés et identifiant stable de leur version
+
+Les fonctions en st.cache_data reçoivent un Dataset plutôt qu'un DataFrame : avec
+DATASET_HASH_FUNCS, Streamlit construit la clé de cache à partir de la seule version
+(artefacts de data/ adressés par le contenu des KML + niveau de détail) au lieu de
+sérialiser toutes les coordonnées à chaque appel.
+"""
+import os
+import uuid
+from dataclasses import dataclass
+import pandas as pd
+from .parsers import POSTES_LAYER, GMR_LAYER, GDP_LAYER, layer_artifact, load_layer
+from .performance_config import POLYGON_DEFAULT_LOD
+from .spatial import attach_zone_columns, zones_artifact
+
+
+@dataclass(frozen=True, eq=False)
+class Dataset:
+    """Table chargée (partagée via st.cache_resource) et version identifiant son contenu"""
+    version: str
+    df: pd.DataFrame
+
+
+# À passer à st.cache_data(hash_funcs=...) : un Dataset est haché par sa version
+DATASET_HASH_FUNCS = {Dataset: lambda dataset: dataset.version}
+
+
+def _artifact_version(name, artifact):
+    try:
+        return os.path.basename(artifact())
+    except Exception:
+        # data/ indisponible (parsing direct des KML) : version propre à ce chargement
+        return f"{name}-{uuid.uuid4().hex}"
+
+
+def layer_dataset(spec, level=None):
+    """Couche chargée par parsers.load_layer, versionnée par son artefact et le niveau de détail servi"""
+    df = load_layer(spec, level)
+    return Dataset(f"{_artifact_version(spec.cache_name, lambda: layer_artifact(spec))}:{level or 'full'}", df)
+
+
+def load_postes_dataset():
+    """Postes avec leur GMR/GDP précalculés (voir spatial.attach_zone_columns)"""
+    postes = layer_dataset(POSTES_LAYER)
+    return Dataset(f"{postes.version}+{_artifact_version('postes_zones', zones_artifact)}", attach_zone_columns(postes.df))
+
+
+def load_gmr_dataset(level=POLYGON_DEFAULT_LOD):
+    """GMR au niveau de détail demandé (None = pleine précision) ; les attributs sont identiques à tous les niveaux"""
+    return layer_dataset(GMR_LAYER, level)
+
+
+def load_gdp_dataset(level=POLYGON_DEFAULT_LOD):
+    return layer_dataset(GDP_LAYER, level)
@@ -0,0 +1,168 @@
+"""
+Cache géométrique colonnaire : table d'attributs + buffers de coordonnées float64 mappables en mémoire
+
+Un cache est un dossier de data/ contenant :
+    attributes.json  colonnes texte (format colonne) et métadonnées
+    numeric.npy      colonnes numériques (latitude, longitude...) en float64 (n_lignes, n_colonnes)
+    coords.npy       tous les sommets [lat, lon] bout à bout en float64 (n_sommets, 2)
+    offsets.npy      int64 (n_lignes + 1) : l'anneau de la ligne i est coords[offsets[i]:offsets[i + 1]]
+    significance.npy float64 (n_sommets) : tolérance Douglas-Peucker de chaque sommet (voir simplify.py)
+    bboxes.npy       float64 (n_lignes, 4) : boîte englobante [lat_min, lon_min, lat_max, lon_max] (NaN sans géométrie)
+    edges.npy        float64 (n_sommets, 3) : arête partant de chaque sommet [lat_min, lat_max, inverse de la pente]
+    *_<niveau>.npy   coords, offsets, bboxes et edges de chaque niveau de détail précalculé
+
+Au chargement, coords.npy est ouvert en mmap : les sommets ne sont jamais désérialisés,
+chaque ligne reçoit une vue numpy sur le buffer partagé entre les processus. Les colonnes
+bbox et edges donnent de même des vues sur bboxes.npy et edges.npy : un test d'appartenance
+commence par quatre comparaisons et n'alloue aucun tableau de géométrie.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+from .simplify import significance, lod_mask
+
+CACHE_FORMAT_VERSION = 3
+GEOMETRY_COLUMN = 'coordinates'
+BBOX_COLUMN = 'bbox'
+EDGES_COLUMN = 'edges'
+
+
+def rings_to_buffers(rings):
+    """Aplatit une liste d'anneaux [[lat, lon], ...] (ou None) en (coords, offsets)"""
+    lengths = np.fromiter((len(r) if isinstance(r, (list, np.ndarray)) else 0 for r in rings),
+                          dtype=np.int64, count=len(rings))
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    coords = np.empty((offsets[-1], 2), dtype=np.float64)
+    for ring, start, end in zip(rings, offsets[:-1], offsets[1:]):
+        if end > start:
+            coords[start:end] = ring
+    return coords, offsets
+
+
+def buffers_to_rings(coords, offsets):
+    """Découpe le buffer en une vue par ligne (None pour les lignes sans géométrie)"""
+    return [coords[start:end] if end > start else None for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def ring_bboxes(coords, offsets):
+    """Boîte englobante [lat_min, lon_min, lat_max, lon_max] de chaque anneau (NaN pour les lignes vides)"""
+    bboxes = np.full((len(offsets) - 1, 4), np.nan)
+    filled = np.flatnonzero(offsets[1:] > offsets[:-1])
+    if len(filled):
+        starts = offsets[:-1][filled]
+        bboxes[filled, :2] = np.minimum.reduceat(coords, starts)
+        bboxes[filled, 2:] = np.maximum.reduceat(coords, starts)
+    return bboxes
+
+
+def ring_edges(coords, offsets):
+    """Table des arêtes (sommet i -> sommet suivant de l'anneau, le dernier rebouclant sur le premier)
+
+    Colonnes : lat_min, lat_max et inverse de la pente dlon/dlat (0 pour une arête horizontale).
+    """
+    following = np.arange(1, len(coords) + 1)
+    filled = offsets[1:] > offsets[:-1]
+    following[offsets[1:][filled] - 1] = offsets[:-1][filled]
+    following = following[:len(coords)]
+    y1, x1 = coords[:, 0], coords[:, 1]
+    y2, x2 = y1[following], x1[following]
+    edges = np.empty((len(coords), 3), dtype=np.float64)
+    np.minimum(y1, y2, out=edges[:, 0])
+    np.maximum(y1, y2, out=edges[:, 1])
+    np.divide(x2 - x1, y2 - y1, out=edges[:, 2], where=y2 != y1)
+    edges[y2 == y1, 2] = 0.0
+    return edges
+
+
+def _save_geometry(cache_dir, coords, offsets, suffix=''):
+    np.save(os.path.join(cache_dir, f'coords{suffix}.npy'), coords)
+    np.save(os.path.join(cache_dir, f'offsets{suffix}.npy'), offsets)
+    np.save(os.path.join(cache_dir, f'bboxes{suffix}.npy'), ring_bboxes(coords, offsets))
+    np.save(os.path.join(cache_dir, f'edges{suffix}.npy'), ring_edges(coords, offsets))
+
+
+def compute_levels(coords, offsets, lod_tolerances):
+    """Significance de chaque sommet et buffers (coords, offsets) de chaque niveau de détail"""
+    sig = np.concatenate([significance(coords[start:end]) for start, end in zip(offsets[:-1], offsets[1:])] or [np.empty(0)])
+    levels = {}
+    for name, tolerance in lod_tolerances.items():
+        mask = np.concatenate([lod_mask(sig[start:end], tolerance) for start, end in zip(offsets[:-1], offsets[1:])] or [np.empty(0, dtype=bool)])
+        # Nombre de sommets conservés avant chaque offset = nouveaux offsets
+        level_offsets = np.concatenate(([0], np.cumsum(mask)))[offsets]
+        levels[name] = (coords[mask], level_offsets)
+    return sig, levels
+
+
+def simplify_geometry(df, tolerance):
+    """DataFrame de parsing dont les anneaux sont réduits à la tolérance donnée (mètres), sans passer par le cache"""
+    if tolerance is None or GEOMETRY_COLUMN not in df.columns:
+        return df
+    coords, offsets = rings_to_buffers(df[GEOMETRY_COLUMN].tolist())
+    _, levels = compute_levels(coords, offsets, {'level': tolerance})
+    df = df.copy()
+    df[GEOMETRY_COLUMN] = buffers_to_rings(*levels['level'])
+    return df
+
+
+def write_geometry_cache(cache_dir, df, lod_tolerances=None):
+    """Écrit un DataFrame de parsing (attributs + colonne coordinates optionnelle) au format colonnaire
+
+    lod_tolerances : {niveau: tolérance en mètres} des niveaux de détail à précalculer
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    numeric_columns = [c for c in df.columns if c != GEOMETRY_COLUMN and pd.api.types.is_float_dtype(df[c])]
+    text_columns = [c for c in df.columns if c != GEOMETRY_COLUMN and c not in numeric_columns]
+    meta = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'n_rows': len(df),
+        'columns': list(df.columns),
+        'numeric_columns': numeric_columns,
+        'has_geometry': GEOMETRY_COLUMN in df.columns,
+        'lod_levels': dict(lod_tolerances or {}) if GEOMETRY_COLUMN in df.columns else {},
+        'text': {c: [None if pd.isna(v) else v for v in df[c].tolist()] for c in text_columns},
+    }
+    np.save(os.path.join(cache_dir, 'numeric.npy'),
+            df[numeric_columns].to_numpy(dtype=np.float64) if numeric_columns else np.empty((len(df), 0)))
+    if meta['has_geometry']:
+        coords, offsets = rings_to_buffers(df[GEOMETRY_COLUMN].tolist())
+        _save_geometry(cache_dir, coords, offsets)
+        if meta['lod_levels']:
+            sig, levels = compute_levels(coords, offsets, meta['lod_levels'])
+            np.save(os.path.join(cache_dir, 'significance.npy'), sig)
+            for name, (level_coords, level_offsets) in levels.items():
+                _save_geometry(cache_dir, level_coords, level_offsets, f'_{name}')
+    with open(os.path.join(cache_dir, 'attributes.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def read_geometry_cache(cache_dir, mmap=True, level=None):
+    """Recharge un cache colonnaire ; coordonnées, boîtes et arêtes sont des vues sur les fichiers mappés en mémoire
+
+    level : niveau de détail à servir dans la colonne coordinates (None = pleine précision)
+    """
+    with open(os.path.join(cache_dir, 'attributes.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != CACHE_FORMAT_VERSION:
+        raise ValueError(f"Format de cache {meta.get('format_version')} non supporté")
+    mmap_mode = 'r' if mmap else None
+    data = dict(meta['text'])
+    columns = list(meta['columns'])
+    numeric = np.load(os.path.join(cache_dir, 'numeric.npy'), mmap_mode=mmap_mode)
+    for i, column in enumerate(meta['numeric_columns']):
+        data[column] = numeric[:, i]
+    if meta['has_geometry']:
+        suffix = f'_{level}' if level in meta.get('lod_levels', {}) else ''
+        # view(np.ndarray) : vues ndarray ordinaires, toujours adossées au fichier mappé
+        def load(name):
+            return np.load(os.path.join(cache_dir, f'{name}{suffix}.npy'), mmap_mode=mmap_mode).view(np.ndarray)
+
+        offsets = np.load(os.path.join(cache_dir, f'offsets{suffix}.npy'))
+        data[GEOMETRY_COLUMN] = buffers_to_rings(load('coords'), offsets)
+        data[EDGES_COLUMN] = buffers_to_rings(load('edges'), offsets)
+        bboxes = load('bboxes')
+        data[BBOX_COLUMN] = [bbox if end > start else None for bbox, start, end in zip(bboxes, offsets[:-1], offsets[1:])]
+        columns += [BBOX_COLUMN, EDGES_COLUMN]
+    df = pd.DataFrame(data, index=pd.RangeIndex(meta['n_rows']))
+    return df[columns]
@@ -0,0 +1,87 @@
+"""
+Cache des cartes générées, partagé par toutes les sessions du processus
+
+Les cartes étaient gardées dans st.session_state sans jamais être libérées : chaque sélection
+parcourue restait en mémoire pour chaque utilisateur. MapCache est un cache LRU borné en octets ;
+les clés sont dérivées du contenu (version des données, postes affichés, options), une carte
+identique est donc partagée entre utilisateurs. Les entrées sont gardées sérialisées (pickle) :
+chaque lecture rend une copie, qu'une session peut modifier sans toucher à celle des autres.
+"""
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def map_key(dataset_version, postes_index, options):
+    """Clé stable d'une carte : version des postes, index des postes affichés et options d'affichage
+
+    Contrairement à hash(), identique d'un processus ou d'un redémarrage à l'autre.
+    """
+    digest = hashlib.sha1(dataset_version.encode('utf-8'))
+    digest.update(np.sort(np.asarray(postes_index, dtype=np.int64)).tobytes())
+    digest.update(repr(options).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+class MapCache:
+    """Cache LRU thread-safe borné en octets, avec compteurs de hits, misses et évictions
+
+    Les valeurs sont stockées sérialisées : la taille comptée est celle de la sérialisation et
+    get() rend une copie neuve à chaque appel.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> valeur sérialisée
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Désérialisation hors du verrou
+        return pickle.loads(entry)
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if key in self._entries:
+                self.size_bytes -= len(self._entries.pop(key))
+            # Une entrée plus grande que le cache entier n'est pas conservée
+            if len(data) > self.max_bytes:
+                return value
+            self._entries[key] = data
+            self.size_bytes += len(data)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, factory):
+        """Valeur en cache, sinon construite par factory() puis insérée (deux sessions peuvent construire en parallèle)"""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, factory())
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -2,43 +2,264 @@
 # Fonctions utilitaires pour la carte (folium, polygones, etc.) - Version optimisée
 #
 import folium
+from folium.plugins import Draw, FastMarkerCluster
+import numpy as np
 import pandas as pd
 import streamlit as st
-from .performance_config import CACHE_TTL_SEARCH, MAP_DEFAULT_ZOOM, MAP_SINGLE_POSTE_ZOOM, POPUP_MAX_WIDTH
+from jinja2 import Template
+from .datasets import DATASET_HASH_FUNCS
+from .performance_config import (
+    CACHE_TTL_DATA, CACHE_TTL_SEARCH, MAP_DEFAULT_ZOOM, MAP_SINGLE_POSTE_ZOOM, POPUP_MAX_WIDTH,
+    MAP_VIEWPORT_MARGIN, MAP_VIEWPORT_MIN_SPAN, MAP_CLUSTER_THRESHOLD, MAP_COORDINATE_PRECISION, POLYGON_LOD_TOLERANCES, POLYGON_LOD_PIXEL_TOLERANCE
+)
+from .polyline import POLYLINE_DECODER_JS, encode_rings
+from .spatial import KDTree, assign_points_to_zones, points_in_polygon, zone_index
 
-@st.cache_data(ttl=CACHE_TTL_SEARCH)
-def point_in_polygon(point_lat, point_lon, polygon_coords):
-    """Vérifie si un point est à l'intérieur d'un polygone - version optimisée avec cache"""
-    try:
-        x, y = float(point_lon), float(point_lat)
-        n = len(polygon_coords)
-        inside = False
-        
-        # Optimisation préliminaire : vérification de la bounding box
-        lats = [coord[0] for coord in polygon_coords]
-        lons = [coord[1] for coord in polygon_coords]
-        if not (min(lats) <= y <= max(lats) and min(lons) <= x <= max(lons)):
-            return False
-        
-        # Algorithme ray casting optimisé
-        p1x, p1y = polygon_coords[0][1], polygon_coords[0][0]
-        for i in range(1, n + 1):
-            p2x, p2y = polygon_coords[i % n][1], polygon_coords[i % n][0]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
-    except Exception:
-        return False
-
-@st.cache_data(ttl=CACHE_TTL_SEARCH, show_spinner=False)
-def create_map_with_gmr_gdp(postes_result, gmr_df, gdp_df, show_all_gmr=False, show_all_gdp=False):
-    """Crée une carte Folium optimisée avec postes, GMR et GDP - Version stable anti-reload"""
+def has_polygon(coords):
+    """Vrai si coords est un anneau exploitable (liste ou vue numpy du cache colonnaire)"""
+    return isinstance(coords, (list, np.ndarray)) and len(coords) > 2
+
+def poste_zone_positions(postes_result, column, zones_df):
+    """Position de la zone de chaque poste : colonne précalculée (gmr_idx/gdp_idx), sinon calcul à la volée"""
+    if column in postes_result.columns:
+        return postes_result[column].fillna(-1).to_numpy(dtype=np.int64)
+    return assign_points_to_zones(postes_result['latitude'], postes_result['longitude'], zones_df)
+
+# Style partagé par toutes les zones d'une couche (objet Leaflet unique, aucun style par entité)
+GMR_STYLE = {'color': 'blue', 'weight': 2, 'fillColor': 'lightblue', 'fillOpacity': 0.3}
+GDP_STYLE = {'color': 'green', 'weight': 2, 'fillColor': 'lightgreen', 'fillOpacity': 0.2}
+
+# Propriété GeoJSON servant de tooltip ; le popup ne porte que l'identifiant de la zone
+GMR_TOOLTIP_FIELD = 'GMR_alias'
+GDP_TOOLTIP_FIELD = 'Poste'
+
+class EncodedGeoJson(folium.GeoJson):
+    """folium.GeoJson dont chaque géométrie est un anneau polyline (voir polyline.py), décodé par le navigateur
+
+    precision : décimales conservées, None = coordonnées GeoJSON pleine précision
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {style: {{ this.shared_style|tojson }}});
+        {%- if this.precision is none %}
+        {{ this.get_name() }}.addData({{ this.data|tojson }});
+        {%- else %}
+        (function (data, factor) {
+            var decode = {{ this.decoder }};
+            data.features.forEach(function (feature) {
+                feature.geometry.coordinates = [decode(feature.geometry.coordinates, factor)];
+            });
+            {{ this.get_name() }}.addData(data);
+        })({{ this.data|tojson }}, {{ 10 ** this.precision }});
+        {%- endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, data, style, precision=MAP_COORDINATE_PRECISION, **kwargs):
+        super().__init__(data, **kwargs)
+        self.shared_style = style
+        self.precision = precision
+        self.decoder = POLYLINE_DECODER_JS
+
+class StaticZonesLayer(folium.map.Layer):
+    """Couche complète GMR ou GDP chargée par le navigateur depuis un fichier statique (voir static_layers.py)
+
+    Le HTML de la carte ne contient que l'URL : le navigateur télécharge la FeatureCollection
+    encodée une fois, la garde en cache HTTP et construit tooltips et popups (identifiant seul).
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {
+            style: {{ this.shared_style|tojson }},
+            onEachFeature: function (feature, layer) {
+                var tooltip = L.DomUtil.create('div');
+                tooltip.innerText = {{ this.label|tojson }} + ': ' + feature.properties[{{ this.tooltip_field|tojson }}];
+                layer.bindTooltip(tooltip, {sticky: false});
+                var popup = L.DomUtil.create('div');
+                popup.innerText = feature.properties.id;
+                layer.bindPopup(popup);
+            }
+        });
+        fetch({{ this.url|tojson }})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                // precision null (MAP_COORDINATE_PRECISION = None) : coordonnées GeoJSON brutes, rien à décoder
+                if (data.precision !== null) {
+                    var decode = {{ this.decoder }};
+                    var factor = Math.pow(10, data.precision);
+                    data.features.forEach(function (feature) {
+                        feature.geometry.coordinates = [decode(feature.geometry.coordinates, factor)];
+                    });
+                }
+                {{ this.get_name() }}.addData(data);
+            })
+            .catch(function (error) {
+                console.error("Couche de zones indisponible : " + {{ this.url|tojson }}, error);
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, url, label, tooltip_field, style):
+        super().__init__(name=label, overlay=True)
+        self._name = "StaticZonesLayer"
+        self.url = url
+        self.label = label
+        self.tooltip_field = tooltip_field
+        self.shared_style = style
+        self.decoder = POLYLINE_DECODER_JS
+
+def feature_id(kind, position):
+    """Identifiant porté par le popup d'une zone : 'GMR-12', 'GDP-3' (position dans la couche)"""
+    return f"{kind}-{position}"
+
+def parse_feature_id(text):
+    """(type, clé) de l'objet cliqué d'après son popup : ('GMR' | 'GDP', position) ou ('poste', identifiant)"""
+    text = (text or '').strip()
+    if not text:
+        return None, None
+    kind, _, position = text.partition('-')
+    if kind in ('GMR', 'GDP') and position.isdigit():
+        return kind, int(position)
+    return 'poste', text
+
+def zones_feature_collection(zone_rows, kind, tooltip_field, precision=MAP_COORDINATE_PRECISION):
+    """FeatureCollection GeoJSON des zones
+
+    Avec precision, la géométrie est un anneau polyline quantifié (à décoder par EncodedGeoJson) ;
+    sans, les anneaux [lat, lon] sont retournés en [lon, lat] et fermés.
+    Propriétés réduites au nom (tooltip) et à l'identifiant (popup) : la fiche détaillée
+    est construite par l'application au clic (voir parse_feature_id).
+    """
+    names = zone_rows[tooltip_field].astype(object).fillna('N/A') if tooltip_field in zone_rows else ['N/A'] * len(zone_rows)
+    # Index des couches = RangeIndex : le libellé de ligne est la position de la zone
+    kept = [(position, ring, name) for position, ring, name in zip(zone_rows.index, zone_rows['coordinates'], names)
+            if has_polygon(ring)]
+    if precision is None:
+        geometries = [[np.vstack((ring[:, ::-1], ring[:1, ::-1])).tolist()]
+                      for ring in (np.asarray(ring, dtype=np.float64) for _, ring, _ in kept)]
+    else:
+        geometries = encode_rings([ring for _, ring, _ in kept], precision)
+    features = [{
+        'type': 'Feature',
+        'properties': {tooltip_field: name, 'id': feature_id(kind, position)},
+        'geometry': {'type': 'Polygon', 'coordinates': geometry},
+    } for (position, _, name), geometry in zip(kept, geometries)]
+    return {'type': 'FeatureCollection', 'features': features}
+
+def add_zone_layer(target, zone_rows, name, tooltip_field, style, precision=MAP_COORDINATE_PRECISION):
+    """Ajoute les zones en une seule couche GeoJSON (style partagé, tooltip et popup lus dans les propriétés)"""
+    collection = zones_feature_collection(zone_rows, name, tooltip_field, precision)
+    if not collection['features']:
+        return
+    EncodedGeoJson(
+        collection,
+        style,
+        precision,
+        name=name,
+        popup=folium.GeoJsonPopup(fields=['id'], labels=False),
+        tooltip=folium.GeoJsonTooltip(fields=[tooltip_field], aliases=[f"{name}:"], sticky=False),
+    ).add_to(target)
+
+def add_gmr_polygons(target, gmr_rows):
+    """Ajoute les polygones GMR (tooltip et identifiant en popup) à la carte ou au groupe de couches target"""
+    add_zone_layer(target, gmr_rows, "GMR", GMR_TOOLTIP_FIELD, GMR_STYLE)
+
+def add_gdp_polygons(target, gdp_rows):
+    """Ajoute les polygones GDP (tooltip et identifiant en popup) à la carte ou au groupe de couches target"""
+    add_zone_layer(target, gdp_rows, "GDP", GDP_TOOLTIP_FIELD, GDP_STYLE)
+
+def add_poste_markers(target, postes_result):
+    """Ajoute un marqueur par poste ; le popup ne porte que l'identifiant du poste
+
+    La fiche détaillée (poste, GMR, GDP) est construite au clic à partir de la valeur
+    renvoyée par st_folium : aucune recherche de zone ni HTML par marqueur ici.
+    """
+    for idx, poste in postes_result.iterrows():
+        if pd.notna(poste.get('latitude')) and pd.notna(poste.get('longitude')):
+            folium.Marker(
+                location=[float(poste['latitude']), float(poste['longitude'])],
+                popup=folium.Popup(str(poste.get('Identifian', 'N/A')), parse_html=True),
+                tooltip=folium.Tooltip(f"Poste: {poste.get('Nom_du_pos', 'N/A')}", sticky=False),
+                icon=folium.Icon(
+                    color='red', 
+                    icon='bolt',
+                    prefix='fa'
+                )
+            ).add_to(target)
+
+# Marqueur créé par le navigateur pour chaque ligne [lat, lon, nom, identifiant, tension] du cluster.
+# Nom et tension sont insérés comme texte (textContent), jamais interprétés comme HTML
+POSTE_CLUSTER_CALLBACK = """function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon({icon: 'bolt', prefix: 'fa', markerColor: MARKER_COLOR}));
+    var popup = L.DomUtil.create('div');
+    popup.innerText = row[3];
+    marker.bindPopup(popup);
+    var tooltip = L.DomUtil.create('span');
+    tooltip.textContent = 'Poste : ' + row[2] + ' (' + row[4] + ')';
+    marker.bindTooltip(tooltip);
+    return marker;
+}"""
+
+def postes_cluster_rows(postes_rows):
+    """Lignes [lat, lon, nom, identifiant, tension] des postes localisés : seules colonnes envoyées au navigateur"""
+    located = postes_rows.dropna(subset=['latitude', 'longitude'])
+    data = located.reindex(columns=['latitude', 'longitude', 'Nom_du_pos', 'Identifian', 'Tension_d'])
+    return data.astype(object).fillna('N/A').values.tolist()
+
+def postes_cluster_callback(color):
+    return POSTE_CLUSTER_CALLBACK.replace('MARKER_COLOR', f"'{color}'")
+
+def add_postes_cluster(target, postes_rows, name, color):
+    """Ajoute les postes en un seul FastMarkerCluster : marqueurs, popups et tooltips sont construits côté navigateur"""
+    FastMarkerCluster(postes_cluster_rows(postes_rows), callback=postes_cluster_callback(color), name=name).add_to(target)
+
+class StaticPostesCluster(FastMarkerCluster):
+    """Cluster de postes dont les lignes sont téléchargées depuis un fichier statique (voir static_layers.py)
+
+    Le HTML de la carte (et donc la carte gardée par MapCache) ne contient que l'URL.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+            {{ this.callback }}
+            var cluster = L.markerClusterGroup({{ this.options|tojson }});
+            cluster.addTo({{ this._parent.get_name() }});
+            fetch({{ this.url|tojson }})
+                .then(function (response) { return response.json(); })
+                .then(function (data) { cluster.addLayers(data.map(callback)); })
+                .catch(function (error) {
+                    console.error("Couche des postes indisponible : " + {{ this.url|tojson }}, error);
+                });
+            return cluster;
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url, name, color):
+        super().__init__([], callback=postes_cluster_callback(color), name=name)
+        self._name = "StaticPostesCluster"
+        self.url = url
+
+def zones_to_show(zones_df, positions, show_all=False, bounds=None):
+    """Zones à dessiner : celles des postes (positions, -1 = hors zone) ou toutes, limitées à bounds si fourni"""
+    if not show_all:
+        # Ne montrer que leur GMR/GDP aux postes sélectionnés
+        return zones_df.iloc[np.unique(positions[positions >= 0])]
+    if bounds is None:
+        return zones_df
+    return zones_df.iloc[zone_index(zones_df).intersecting(*bounds)]
+
+def create_map_with_gmr_gdp(postes_result, gmr, gdp, show_all_gmr=False, show_all_gdp=False, draw_zones=True, all_postes=None, all_postes_url=None):
+    """Crée une carte Folium optimisée avec postes, GMR et GDP - Version stable anti-reload
+
+    gmr, gdp : datasets.Dataset
+    Pas de st.cache_data : les cartes sont gardées par map_cache.MapCache, partagé entre sessions
+    draw_zones : False pour ne placer que les marqueurs (polygones fournis par create_zones_layer)
+    all_postes : Dataset des postes à afficher en plus, regroupés en clusters (couche nationale)
+    all_postes_url : URL statique de ces postes (voir static_layers.postes_layer_url), préférée à all_postes
+    """
+    gmr_df, gdp_df = gmr.df, gdp.df
     
     # Créer la carte centrée sur la France avec options de stabilité
     m = folium.Map(
@@ -53,155 +274,25 @@ def create_map_with_gmr_gdp(postes_result, gmr_df, gdp_df, show_all_gmr=False, s
         dragging=True
     )
     
-    # Optimisation : déterminer les polygones à afficher en fonction des options
-    if show_all_gmr:
-        gmr_to_show = gmr_df
-    else:
-        # Ne montrer que son GMR aux postes sélectionnés
-        relevant_gmr_indices = set()
-        for idx, poste in postes_result.iterrows():
-            if pd.notna(poste.get('latitude')) and pd.notna(poste.get('longitude')):
-                for gmr_idx, gmr in gmr_df.iterrows():
-                    if 'coordinates' in gmr and gmr['coordinates']:
-                        if point_in_polygon(poste['latitude'], poste['longitude'], gmr['coordinates']):
-                            relevant_gmr_indices.add(gmr_idx)
-                            break  # Un poste ne peut être que dans un GMR
-        gmr_to_show = gmr_df.loc[list(relevant_gmr_indices)] if relevant_gmr_indices else pd.DataFrame()
-
-    if show_all_gdp:
-        gdp_to_show = gdp_df
+    # Ajouter les polygones GMR et GDP des postes sélectionnés (jointure précalculée, aucun parcours de polygones)
+    if draw_zones:
+        gmr_positions = poste_zone_positions(postes_result, 'gmr_idx', gmr_df)
+        gdp_positions = poste_zone_positions(postes_result, 'gdp_idx', gdp_df)
+        add_gmr_polygons(m, zones_to_show(gmr_df, gmr_positions, show_all_gmr))
+        add_gdp_polygons(m, zones_to_show(gdp_df, gdp_positions, show_all_gdp))
+
+    # Marqueurs des postes : individuels avec popup complet, regroupés au-delà de MAP_CLUSTER_THRESHOLD
+    if len(postes_result) > MAP_CLUSTER_THRESHOLD:
+        add_postes_cluster(m, postes_result, "Postes sélectionnés", 'red')
     else:
-        # Ne montrer que son GDP aux postes sélectionnés
-        relevant_gdp_indices = set()
-        for idx, poste in postes_result.iterrows():
-            if pd.notna(poste.get('latitude')) and pd.notna(poste.get('longitude')):
-                for gdp_idx, gdp in gdp_df.iterrows():
-                    if 'coordinates' in gdp and gdp['coordinates']:
-                        if point_in_polygon(poste['latitude'], poste['longitude'], gdp['coordinates']):
-                            relevant_gdp_indices.add(gdp_idx)
-                            break  # Un poste ne peut être que dans un GDP
-        gdp_to_show = gdp_df.loc[list(relevant_gdp_indices)] if relevant_gdp_indices else pd.DataFrame()
-
-    # Ajouter les polygones GMR avec popups améliorés
-    for idx, gmr in gmr_to_show.iterrows():
-        if 'coordinates' in gmr and gmr['coordinates'] and len(gmr['coordinates']) > 2:
-            popup_text = f"""
-            <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size: 13px; max-width: 280px; padding: 10px; line-height: 1.4; background-color: white; border-radius: 5px;">
-                <div style="color: #1f4e79; font-weight: bold; font-size: 15px; margin-bottom: 8px; border-bottom: 2px solid #1f4e79; padding-bottom: 4px;">
-                    &#x1F535; GMR
-                </div>
-                <div style="color: #333;">
-                    <div style="font-weight: bold; margin-bottom: 2px;">{gmr.get('GMR_alias', 'N/A')}</div>
-                    <div style="color: #666; font-size: 12px;">
-                        <span style="font-weight: 600;">Code:</span> {gmr.get('GMR', 'N/A')}<br>
-                        <span style="font-weight: 600;">Siège:</span> {gmr.get('Siège_du_', 'N/A')}
-                    </div>
-                </div>
-            </div>
-            """
-            folium.Polygon(
-                locations=gmr['coordinates'],
-                popup=folium.Popup(popup_text, max_width=320, parse_html=False),
-                color='blue',
-                weight=2,
-                fillColor='lightblue',
-                fillOpacity=0.3,
-                tooltip=folium.Tooltip(f"GMR: {gmr.get('GMR_alias', 'N/A')}", sticky=False)
-            ).add_to(m)
-
-    # Ajouter les polygones GDP avec popups améliorés
-    for idx, gdp in gdp_to_show.iterrows():
-        if 'coordinates' in gdp and gdp['coordinates'] and len(gdp['coordinates']) > 2:
-            popup_text = f"""
-            <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size: 13px; max-width: 280px; padding: 10px; line-height: 1.4; background-color: white; border-radius: 5px;">
-                <div style="color: #2d5016; font-weight: bold; font-size: 15px; margin-bottom: 8px; border-bottom: 2px solid #2d5016; padding-bottom: 4px;">
-                    &#x1F7E2; GDP
-                </div>
-                <div style="color: #333;">
-                    <div style="font-weight: bold; margin-bottom: 2px;">{gdp.get('Poste', 'N/A')}</div>
-                    <div style="color: #666; font-size: 12px;">
-                        <span style="font-weight: 600;">Code:</span> {gdp.get('Code', 'N/A')}<br>
-                        <span style="font-weight: 600;">DI:</span> {gdp.get('Nom_du_cen', 'N/A')}<br>
-                        <span style="font-weight: 600;">GMR:</span> {gdp.get('GMR', 'N/A')}
-                    </div>
-                </div>
-            </div>
-            """
-            folium.Polygon(
-                locations=gdp['coordinates'],
-                popup=folium.Popup(popup_text, max_width=320, parse_html=False),
-                color='green',
-                weight=2,
-                fillColor='lightgreen',
-                fillOpacity=0.2,
-                tooltip=folium.Tooltip(f"GDP: {gdp.get('Poste', 'N/A')}", sticky=False)
-            ).add_to(m)
-
-    # Ajouter les marqueurs de postes avec informations optimisées
-    coordinates_for_centering = []
-    
-    for idx, poste in postes_result.iterrows():
-        if pd.notna(poste.get('latitude')) and pd.notna(poste.get('longitude')):
-            lat, lon = float(poste['latitude']), float(poste['longitude'])
-            coordinates_for_centering.append([lat, lon])
-            
-            # Informations contextuelles optimisées
-            gmr_info = find_gmr_for_poste(lat, lon, gmr_df)
-            gdp_info = find_gdp_for_poste(lat, lon, gdp_df)
-
-            # Construction du popup compatible en hébergement cloud streamlit avec styles
-            popup_content = f"""
-            <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; font-size: 13px; max-width: 280px; padding: 10px; line-height: 1.4; background-color: white; border-radius: 5px;">
-                <div style="color: #d73027; font-weight: bold; font-size: 15px; margin-bottom: 8px; border-bottom: 2px solid #d73027; padding-bottom: 4px;">
-                    &#x1F534; POSTE RTE
-                </div>
-                <div style="margin-bottom: 8px;">
-                    <div style="font-weight: bold; color: #333; margin-bottom: 2px;">{poste.get('Nom_du_pos', 'N/A')}</div>
-                    <div style="color: #666; font-size: 12px;">
-                        <span style="font-weight: 600;">ID:</span> {poste.get('Identifian', 'N/A')}<br>
-                        <span style="font-weight: 600;">Tension:</span> {poste.get('Tension_d', 'N/A')}<br>
-                        <span style="font-weight: 600;">Coordonnées:</span> {lat:.4f}, {lon:.4f}
-                    </div>
-                </div>
-            """
-            
-            if gmr_info is not None:
-                popup_content += f"""
-                <div style="border-top: 1px solid #e0e0e0; padding-top: 8px; margin-bottom: 8px;">
-                    <div style="color: #1f4e79; font-weight: bold; font-size: 13px; margin-bottom: 3px;">
-                        &#x1F535; GMR - {gmr_info.get('GMR_alias', 'N/A')}
-                    </div>
-                    <div style="color: #666; font-size: 12px;">
-                        <span style="font-weight: 600;">Siège:</span> {gmr_info.get('Siège_du_', 'N/A')}
-                    </div>
-                </div>
-                """
-            
-            if gdp_info is not None:
-                popup_content += f"""
-                <div style="border-top: 1px solid #e0e0e0; padding-top: 8px;">
-                    <div style="color: #2d5016; font-weight: bold; font-size: 13px; margin-bottom: 3px;">
-                        &#x1F7E2; GDP - {gdp_info.get('Poste', 'N/A')}
-                    </div>
-                    <div style="color: #666; font-size: 12px;">
-                        <span style="font-weight: 600;">DI:</span> {gdp_info.get('Nom_du_cen', 'N/A')}
-                    </div>
-                </div>
-                """
-            
-            popup_content += "</div>"
-            
-            # Marqueur personnalisé
-            folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_content, max_width=320, parse_html=False),
-                tooltip=folium.Tooltip(f"Poste: {poste.get('Nom_du_pos', 'N/A')}", sticky=False),
-                icon=folium.Icon(
-                    color='red', 
-                    icon='bolt',
-                    prefix='fa'
-                )
-            ).add_to(m)
+        add_poste_markers(m, postes_result)
+    if all_postes_url:
+        StaticPostesCluster(all_postes_url, "Tous les postes", 'cadetblue').add_to(m)
+    elif all_postes is not None:
+        add_postes_cluster(m, all_postes.df, "Tous les postes", 'cadetblue')
+
+    located = postes_result[['latitude', 'longitude']].dropna()
+    coordinates_for_centering = located.astype(float).values.tolist()
 
     # Centrage automatique sur les postes sélectionnés
     if coordinates_for_centering:
@@ -215,26 +306,136 @@ def create_map_with_gmr_gdp(postes_result, gmr_df, gdp_df, show_all_gmr=False, s
 
     return m
 
-@st.cache_data(ttl=CACHE_TTL_SEARCH)
-def find_gmr_for_poste(poste_lat, poste_lon, gmr_df):
-    """Trouve le GMR qui contient le poste donné"""
-    try:
-        for idx, gmr in gmr_df.iterrows():
-            if 'coordinates' in gmr and gmr['coordinates']:
-                if point_in_polygon(poste_lat, poste_lon, gmr['coordinates']):
-                    return gmr
-        return None
-    except Exception:
-        return None
+@st.cache_resource(ttl=CACHE_TTL_DATA, hash_funcs=DATASET_HASH_FUNCS, show_spinner=False)
+def poste_index(postes):
+    """KD-tree des postes chargés, construit une seule fois par version"""
+    return KDTree(postes.df['latitude'], postes.df['longitude'])
 
-@st.cache_data(ttl=CACHE_TTL_SEARCH)
-def find_gdp_for_poste(poste_lat, poste_lon, gdp_df):
-    """Trouve le GDP qui contient le poste donné"""
+@st.cache_data(ttl=CACHE_TTL_SEARCH, hash_funcs=DATASET_HASH_FUNCS)
+def find_postes_near(lat, lon, postes, radius_km=None, k=None):
+    """Postes à moins de radius_km du point et/ou ses k plus proches, triés par distance (colonne distance_km)"""
+    index = poste_index(postes)
+    if k:
+        positions, distances = index.query_nearest(lat, lon, k)
+        if radius_km is not None:
+            positions, distances = positions[distances <= radius_km], distances[distances <= radius_km]
+    else:
+        positions, distances = index.query_radius(lat, lon, radius_km)
+    result = postes.df.iloc[positions].copy()
+    result['distance_km'] = distances
+    return result
+
+def create_selection_map():
+    """Carte de France avec les outils de dessin (polygone, rectangle) pour sélectionner des postes"""
+    m = folium.Map(
+        location=[46.603354, 1.888334],
+        zoom_start=MAP_DEFAULT_ZOOM,
+        tiles='OpenStreetMap',
+        prefer_canvas=True
+    )
+    Draw(
+        export=False,
+        draw_options={
+            'polygon': True,
+            'rectangle': True,
+            'polyline': False,
+            'circle': False,
+            'marker': False,
+            'circlemarker': False
+        }
+    ).add_to(m)
+    return m
+
+def drawing_rings(drawings):
+    """Anneaux [[lat, lon], ...] des polygones et rectangles dessinés (GeoJSON renvoyé par st_folium)"""
+    rings = []
+    for feature in drawings or []:
+        geometry = (feature or {}).get('geometry') or {}
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry.get('coordinates')]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry.get('coordinates')
+        else:
+            continue
+        for polygon in polygons or []:
+            # Seul le contour extérieur compte, le GeoJSON est en [lon, lat]
+            if polygon and len(polygon[0]) > 2:
+                rings.append(np.asarray(polygon[0], dtype=np.float64)[:, ::-1])
+    return rings
+
+@st.cache_data(ttl=CACHE_TTL_SEARCH, hash_funcs=DATASET_HASH_FUNCS)
+def find_postes_in_drawings(drawings, postes):
+    """Postes contenus dans au moins une zone dessinée (ray casting vectorisé, préfiltré par boîte englobante)"""
+    postes_df = postes.df
+    lats, lons = postes_df['latitude'].to_numpy(), postes_df['longitude'].to_numpy()
+    inside = np.zeros(len(postes_df), dtype=bool)
+    for ring in drawing_rings(drawings):
+        pending = np.flatnonzero(~inside)
+        inside[pending[points_in_polygon(lats[pending], lons[pending], ring)]] = True
+    return postes_df[inside]
+
+def viewport_bounds(map_bounds):
+    """Boîte (lat_min, lon_min, lat_max, lon_max) de la vue renvoyée par st_folium, élargie puis arrondie
+
+    La marge et l'arrondi (pas adapté à la taille de la vue) laissent la boîte inchangée lors
+    des petits déplacements : la couche des zones visibles reste alors en cache.
+    """
     try:
-        for idx, gdp in gdp_df.iterrows():
-            if 'coordinates' in gdp and gdp['coordinates']:
-                if point_in_polygon(poste_lat, poste_lon, gdp['coordinates']):
-                    return gdp
+        south_west, north_east = map_bounds['_southWest'], map_bounds['_northEast']
+        lat_min, lon_min = float(south_west['lat']), float(south_west['lng'])
+        lat_max, lon_max = float(north_east['lat']), float(north_east['lng'])
+    except (KeyError, TypeError, ValueError):
         return None
-    except Exception:
+    span = max(lat_max - lat_min, lon_max - lon_min, 1e-3)
+    step = 10 ** np.floor(np.log10(span / 4))
+    margin = span * MAP_VIEWPORT_MARGIN
+    return (
+        round(float(np.floor((lat_min - margin) / step) * step), 6),
+        round(float(np.floor((lon_min - margin) / step) * step), 6),
+        round(float(np.ceil((lat_max + margin) / step) * step), 6),
+        round(float(np.ceil((lon_max + margin) / step) * step), 6),
+    )
+
+def initial_viewport(postes_result):
+    """Vue estimée avant le premier retour de la carte : emprise des postes affichés"""
+    lats, lons = postes_result['latitude'].dropna(), postes_result['longitude'].dropna()
+    if lats.empty or lons.empty:
         return None
+    half = MAP_VIEWPORT_MIN_SPAN / 2
+    return viewport_bounds({
+        '_southWest': {'lat': min(lats.min(), lats.mean() - half), 'lng': min(lons.min(), lons.mean() - half)},
+        '_northEast': {'lat': max(lats.max(), lats.mean() + half), 'lng': max(lons.max(), lons.mean() + half)},
+    })
+
+def lod_for_zoom(zoom, lat=46.6):
+    """Niveau de détail à servir pour un zoom Leaflet (None = pleine précision)
+
+    Le niveau retenu est le plus simplifié dont la tolérance Douglas-Peucker reste sous
+    POLYGON_LOD_PIXEL_TOLERANCE pixel à ce zoom : l'écart au tracé exact est invisible.
+    """
+    meters_per_pixel = 156543.03392 * np.cos(np.radians(lat)) / 2 ** zoom
+    levels = [(tolerance, name) for name, tolerance in POLYGON_LOD_TOLERANCES.items()
+              if tolerance <= meters_per_pixel * POLYGON_LOD_PIXEL_TOLERANCE]
+    return max(levels)[1] if levels else None
+
+@st.cache_data(ttl=CACHE_TTL_SEARCH, show_spinner=False, hash_funcs=DATASET_HASH_FUNCS)
+def create_zones_layer(postes_result, gmr, gdp, bounds=None, show_all_gmr=False, show_all_gdp=False, static_urls=None):
+    """Couche des GMR/GDP à afficher, au niveau de détail des Datasets reçus (voir lod_for_zoom)
+
+    À passer à st_folium(feature_group_to_add=...) : la couche est remplacée sans recharger la carte.
+    Avec « Afficher tous », la couche complète est référencée par son URL statique si static_urls
+    ({'GMR': url, 'GDP': url}) la fournit ; sinon seules les zones dont la boîte englobante
+    intersecte bounds (lat_min, lon_min, lat_max, lon_max) sont envoyées (requête R-tree),
+    None = toute la France.
+    """
+    layer = folium.FeatureGroup(name="Zones")
+    static_urls = static_urls or {}
+    for kind, column, show_all, zones, add_polygons, tooltip_field, style in (
+            ('GMR', 'gmr_idx', show_all_gmr, gmr, add_gmr_polygons, GMR_TOOLTIP_FIELD, GMR_STYLE),
+            ('GDP', 'gdp_idx', show_all_gdp, gdp, add_gdp_polygons, GDP_TOOLTIP_FIELD, GDP_STYLE)):
+        if show_all and static_urls.get(kind):
+            StaticZonesLayer(static_urls[kind], kind, tooltip_field, style).add_to(layer)
+            continue
+        positions = poste_zone_positions(postes_result, column, zones.df)
+        add_polygons(layer, zones_to_show(zones.df, positions, show_all, bounds))
+    return layer
@@ -1,255 +1,212 @@
 """
 Parsers KML pour postes, GMR et GDP
+
+Un seul moteur (parse_layer) piloté par une description de couche (LayerSpec) :
+champs SimpleData conservés, chemins de géométrie, clé obligatoire.
 """
-import os
-from .config import get_kml_path, get_cache_path
-import pickle
+from dataclasses import dataclass, replace
+from .config import get_kml_path
+from .cache_manifest import ensure_artifact
+from .geo_cache import CACHE_FORMAT_VERSION, read_geometry_cache, simplify_geometry, write_geometry_cache
+from .performance_config import POLYGON_LOD_TOLERANCES, POLYGON_DEFAULT_LOD
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 
-def parse_postes_kml_optimized():
+# À incrémenter dès que la sortie du parsing change : invalide les caches de data/
+PARSER_VERSION = 2
+
+KML_NS = '{http://www.opengis.net/kml/2.2}'
+NS = {'kml': 'http://www.opengis.net/kml/2.2'}
+
+@dataclass(frozen=True)
+class LayerSpec:
+    """Description d'une couche KML pour le moteur de parsing"""
+    label: str                      # Nom affiché dans les messages d'erreur
+    kml_filename: str               # Fichier dans kml/
+    cache_name: str                 # Dossier de cache dans data/
+    required_key: str = None        # SimpleData obligatoire pour garder un placemark
+    fields: tuple = None            # SimpleData conservés (None = tous)
+    geometry: str = 'polygon'       # 'point' (latitude/longitude) ou 'polygon' (coordinates)
+    geometry_paths: tuple = ()      # Chemins essayés dans l'ordre, relatifs au Placemark
+    column_aliases: tuple = ()      # Colonnes dupliquées : ((nouvelle, source), ...)
+
+POSTES_LAYER = LayerSpec(
+    label='Poste.kml',
+    kml_filename='Poste.kml',
+    cache_name='postes_cache',
+    required_key='Nom_du_pos',
+    fields=('Nom_du_pos', 'Identifian', 'Tension_d', 'Tension_00'),
+    geometry='point',
+    geometry_paths=('.//kml:coordinates',),
+    column_aliases=(('Nom poste', 'Nom_du_pos'),),
+)
+
+GMR_LAYER = LayerSpec(
+    label='GMR.kml',
+    kml_filename='GMR.kml',
+    cache_name='gmr_cache',
+    required_key='Siège_du_',
+    fields=('GMR', 'GMR_alias', 'Siège_du_'),
+    geometry_paths=('.//kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates',),
+)
+
+GDP_LAYER = LayerSpec(
+    label='GDP.kml',
+    kml_filename='GDP.kml',
+    cache_name='gdp_cache',
+    required_key='Poste',
+    fields=('Poste', 'Code', 'Nom_du_cen', 'GMR'),
+    geometry_paths=(
+        './/kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates',
+        './/kml:MultiGeometry/kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates',
+    ),
+)
+
+def iter_placemarks(kml_file):
+    """Parcourt un KML placemark par placemark (iterparse) sans garder l'arbre complet en mémoire"""
+    parents = []
+    for event, elem in ET.iterparse(kml_file, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == f'{KML_NS}Placemark':
+            yield elem
+            # Libérer le placemark traité : on le détache de son parent pour que l'arbre reste vide
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+def parse_coordinates(text):
+    """Convertit un texte KML 'lon,lat[,alt] ...' en tableau numpy (n, 2) de [lat, lon]"""
+    tokens = text.split()
+    if not tokens:
+        return np.empty((0, 2))
+    dims = tokens[0].count(',') + 1
     try:
-        cache_file = get_cache_path("postes_cache.pkl")
-        kml_file = get_kml_path("Poste.kml")
-        if (os.path.exists(cache_file) and os.path.exists(kml_file) and 
-            os.path.getmtime(cache_file) > os.path.getmtime(kml_file)):
+        # Chemin rapide : tous les tuples ont la même dimension, numpy convertit tout d'un coup
+        values = np.array(text.replace(',', ' ').split(), dtype=np.float64)
+        if dims >= 2 and len(values) == dims * len(tokens):
+            return values.reshape(-1, dims)[:, [1, 0]]
+    except ValueError:
+        pass
+    # Chemin tolérant : on ignore les tuples mal formés
+    coord_pairs = []
+    for coord in tokens:
+        parts = coord.split(',')
+        if len(parts) >= 2:
             try:
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                pass
-        tree = ET.parse(kml_file)
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        postes_data = []
-        placemarks = root.findall('.//kml:Placemark', ns)
-        for placemark in placemarks:
-            extended_data = placemark.find('.//kml:ExtendedData/kml:SchemaData', ns)
-            if extended_data is not None:
-                poste_info = {}
-                essential_fields = ['Nom_du_pos', 'Identifian', 'Tension_d', 'Tension_00']
-                for simple_data in extended_data.findall('kml:SimpleData', ns):
-                    name = simple_data.get('name')
-                    value = simple_data.text
-                    if name in essential_fields and value:
-                        poste_info[name] = value
-                coordinates = placemark.find('.//kml:coordinates', ns)
-                if coordinates is not None and coordinates.text:
-                    coords = coordinates.text.strip().split(',')
-                    if len(coords) >= 2:
-                        try:
-                            poste_info['longitude'] = float(coords[0])
-                            poste_info['latitude'] = float(coords[1])
-                        except ValueError:
-                            continue
-                if 'longitude' in poste_info and 'latitude' in poste_info and 'Nom_du_pos' in poste_info:
-                    postes_data.append(poste_info)
-        df = pd.DataFrame(postes_data)
-        if 'Nom_du_pos' in df.columns:
-            df['Nom poste'] = df['Nom_du_pos']
-        try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(df, f)
-        except:
-            pass
-        return df
-    except Exception as e:
-        print(f"Erreur lors du parsing du fichier Poste.kml : {e}")
-        return pd.DataFrame()
+                coord_pairs.append([float(parts[1]), float(parts[0])])
+            except ValueError:
+                continue
+    return np.array(coord_pairs, dtype=np.float64).reshape(-1, 2)
 
-def parse_gmr_kml_optimized(high_precision=False):
+def _read_fields(placemark, spec):
+    # Projection à la lecture : seuls les SimpleData demandés sont matérialisés
+    info = {}
+    for simple_data in placemark.iterfind('.//kml:ExtendedData/kml:SchemaData/kml:SimpleData', NS):
+        name = simple_data.get('name')
+        if name and simple_data.text and (spec.fields is None or name in spec.fields):
+            info[name] = simple_data.text
+    return info
+
+def _read_geometry(placemark, spec):
+    for path in spec.geometry_paths:
+        node = placemark.find(path, NS)
+        if node is not None and node.text:
+            return node.text.strip()
+    return None
+
+def parse_layer(spec, kml_file=None):
+    """Parse une couche KML décrite par spec et retourne un DataFrame (géométrie en pleine précision)"""
+    rows = []
+    for placemark in iter_placemarks(kml_file or get_kml_path(spec.kml_filename)):
+        if placemark.find('.//kml:ExtendedData/kml:SchemaData', NS) is None:
+            continue
+        info = _read_fields(placemark, spec)
+        if spec.required_key and spec.required_key not in info:
+            continue
+        coords_text = _read_geometry(placemark, spec)
+        if spec.geometry == 'point':
+            # Placemark sans coordonnées exploitables : gardé (recherche par nom) avec latitude/longitude NaN
+            coords = parse_coordinates(coords_text) if coords_text else None
+            located = coords is not None and len(coords) > 0
+            info['longitude'] = float(coords[0, 1]) if located else np.nan
+            info['latitude'] = float(coords[0, 0]) if located else np.nan
+        elif coords_text:
+            coords = parse_coordinates(coords_text)
+            if len(coords):
+                info['coordinates'] = coords
+        if info:
+            rows.append(info)
+    df = pd.DataFrame(rows)
+    for alias, source in spec.column_aliases:
+        if source in df.columns:
+            df[alias] = df[source]
+    return df
+
+def layer_artifact(spec):
+    """Dossier du cache colonnaire de la couche pour le contenu actuel du KML (construit une seule fois s'il manque)"""
+    kml_file = get_kml_path(spec.kml_filename)
+    lod_tolerances = POLYGON_LOD_TOLERANCES if spec.geometry == 'polygon' else None
+    params = {
+        'parser_version': PARSER_VERSION,
+        'cache_format': CACHE_FORMAT_VERSION,
+        'fields': spec.fields,
+        'lod': lod_tolerances,
+    }
+    return ensure_artifact(spec.cache_name, [kml_file], params,
+                           lambda cache_dir: write_geometry_cache(cache_dir, parse_layer(spec, kml_file), lod_tolerances))
+
+def read_layer(spec, level=None):
+    """Retourne la couche depuis son cache colonnaire de data/ (voir cache_manifest.py) ; les erreurs de parsing remontent
+
+    level : niveau de détail servi pour les polygones (None = pleine précision). Tous les niveaux
+    de POLYGON_LOD_TOLERANCES sont précalculés dans le même cache lors du parsing.
+    À utiliser pour construire d'autres artefacts : un résultat de repli ne doit jamais y être figé.
+    """
     try:
-        cache_suffix = "_hq" if high_precision else ""
-        cache_file = get_cache_path(f"gmr_cache{cache_suffix}.pkl")
-        kml_file = get_kml_path("GMR.kml")
-        if (os.path.exists(cache_file) and os.path.exists(kml_file) and 
-            os.path.getmtime(cache_file) > os.path.getmtime(kml_file)):
-            try:
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                pass
-        tree = ET.parse(kml_file)
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        gmr_data = []
-        for placemark in root.findall('.//kml:Placemark', ns):
-            extended_data = placemark.find('.//kml:ExtendedData/kml:SchemaData', ns)
-            if extended_data is not None:
-                gmr_info = {}
-                for simple_data in extended_data.findall('kml:SimpleData', ns):
-                    name = simple_data.get('name')
-                    value = simple_data.text
-                    if name and value:
-                        gmr_info[name] = value
-                geometry = placemark.find('.//kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', ns)
-                if geometry is not None and geometry.text:
-                    coords_text = geometry.text.strip()
-                    coord_pairs = []
-                    coords_list = coords_text.split()
-                    if high_precision:
-                        step = 1
-                    else:
-                        if len(coords_list) <= 100:
-                            step = 1
-                        elif len(coords_list) <= 500:
-                            step = max(1, len(coords_list) // 200)
-                        elif len(coords_list) <= 2000:
-                            step = max(1, len(coords_list) // 300)
-                        else:
-                            step = max(1, len(coords_list) // 400)
-                    for i in range(0, len(coords_list), step):
-                        coord = coords_list[i]
-                        if ',' in coord:
-                            parts = coord.split(',')
-                            if len(parts) >= 2:
-                                try:
-                                    coord_pairs.append([float(parts[1]), float(parts[0])])
-                                except ValueError:
-                                    continue
-                    if coord_pairs:
-                        gmr_info['coordinates'] = coord_pairs
-                if gmr_info and 'Siège_du_' in gmr_info:
-                    gmr_data.append(gmr_info)
-        df = pd.DataFrame(gmr_data)
-        try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(df, f)
-        except:
-            pass
-        return df
-    except Exception as e:
-        print(f"Erreur lors du parsing du fichier GMR.kml : {e}")
-        return pd.DataFrame()
+        return read_geometry_cache(layer_artifact(spec), level=level)
+    except OSError as e:
+        # data/ non inscriptible ou cache illisible : on sert le parsing direct, sans cache,
+        # simplifié au niveau demandé comme le serait le cache
+        print(f"Cache indisponible pour {spec.label}, parsing direct : {e}")
+        return simplify_geometry(parse_layer(spec), POLYGON_LOD_TOLERANCES.get(level))
 
-def parse_gdp_kml_optimized(high_precision=False):
+def load_layer(spec, level=None):
+    """Comme read_layer, mais une couche illisible donne un DataFrame vide (affichage dans l'application)"""
     try:
-        cache_suffix = "_hq" if high_precision else ""
-        cache_file = get_cache_path(f"gdp_cache{cache_suffix}.pkl")
-        kml_file = get_kml_path("GDP.kml")
-        if (os.path.exists(cache_file) and os.path.exists(kml_file) and 
-            os.path.getmtime(cache_file) > os.path.getmtime(kml_file)):
-            try:
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                pass
-        tree = ET.parse(kml_file)
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        gdp_data = []
-        for placemark in root.findall('.//kml:Placemark', ns):
-            extended_data = placemark.find('.//kml:ExtendedData/kml:SchemaData', ns)
-            if extended_data is not None:
-                gdp_info = {}
-                for simple_data in extended_data.findall('kml:SimpleData', ns):
-                    name = simple_data.get('name')
-                    value = simple_data.text
-                    if name and value:
-                        gdp_info[name] = value
-                geometry = placemark.find('.//kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', ns)
-                if geometry is None:
-                    geometry = placemark.find('.//kml:MultiGeometry/kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', ns)
-                if geometry is not None and geometry.text:
-                    coords_text = geometry.text.strip()
-                    coord_pairs = []
-                    coords_list = coords_text.split()
-                    if high_precision:
-                        step = 1
-                    else:
-                        if len(coords_list) <= 100:
-                            step = 1
-                        elif len(coords_list) <= 500:
-                            step = max(1, len(coords_list) // 200)
-                        elif len(coords_list) <= 2000:
-                            step = max(1, len(coords_list) // 300)
-                        else:
-                            step = max(1, len(coords_list) // 400)
-                    for i in range(0, len(coords_list), step):
-                        coord = coords_list[i]
-                        if ',' in coord:
-                            parts = coord.split(',')
-                            if len(parts) >= 2:
-                                try:
-                                    coord_pairs.append([float(parts[1]), float(parts[0])])
-                                except ValueError:
-                                    continue
-                    if coord_pairs:
-                        gdp_info['coordinates'] = coord_pairs
-                if gdp_info and 'Poste' in gdp_info:
-                    gdp_data.append(gdp_info)
-        df = pd.DataFrame(gdp_data)
-        try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(df, f)
-        except:
-            pass
-        return df
+        return read_layer(spec, level)
     except Exception as e:
-        print(f"Erreur lors du parsing du fichier GDP.kml : {e}")
+        print(f"Erreur lors du parsing du fichier {spec.label} : {e}")
         return pd.DataFrame()
 
+def parse_postes_kml_optimized():
+    return load_layer(POSTES_LAYER)
+
+def parse_gmr_kml_optimized(high_precision=False):
+    return load_layer(GMR_LAYER, None if high_precision else POLYGON_DEFAULT_LOD)
+
+def parse_gdp_kml_optimized(high_precision=False):
+    return load_layer(GDP_LAYER, None if high_precision else POLYGON_DEFAULT_LOD)
+
 def parse_postes_kml():
+    # Version sans cache conservant tous les attributs du KML
     try:
-        tree = ET.parse(get_kml_path("Poste.kml"))
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        postes_data = []
-        for placemark in root.findall('.//kml:Placemark', ns):
-            extended_data = placemark.find('.//kml:ExtendedData/kml:SchemaData', ns)
-            if extended_data is not None:
-                poste_info = {}
-                for simple_data in extended_data.findall('kml:SimpleData', ns):
-                    name = simple_data.get('name')
-                    value = simple_data.text
-                    if name and value:
-                        poste_info[name] = value
-                coordinates = placemark.find('.//kml:coordinates', ns)
-                if coordinates is not None and coordinates.text:
-                    coords = coordinates.text.strip().split(',')
-                    if len(coords) >= 2:
-                        poste_info['longitude'] = float(coords[0])
-                        poste_info['latitude'] = float(coords[1])
-                        poste_info['Geo Point'] = f"{coords[1]},{coords[0]}"
-                if poste_info:
-                    postes_data.append(poste_info)
-        df = pd.DataFrame(postes_data)
-        if 'Nom_du_pos' in df.columns:
-            df['Nom poste'] = df['Nom_du_pos']
+        df = parse_layer(replace(POSTES_LAYER, fields=None, required_key=None))
+        if 'latitude' in df.columns:
+            located = df['latitude'].notna() & df['longitude'].notna()
+            df.loc[located, 'Geo Point'] = df['latitude'].astype(str) + ',' + df['longitude'].astype(str)
         return df
     except Exception as e:
         print(f"Erreur lors du parsing du fichier Poste.kml : {e}")
         return pd.DataFrame()
 
 def parse_gmr_kml():
+    # Version sans cache ni simplification conservant tous les attributs du KML
     try:
-        tree = ET.parse(get_kml_path("GMR.kml"))
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        gmr_data = []
-        for placemark in root.findall('.//kml:Placemark', ns):
-            extended_data = placemark.find('.//kml:ExtendedData/kml:SchemaData', ns)
-            if extended_data is not None:
-                gmr_info = {}
-                for simple_data in extended_data.findall('kml:SimpleData', ns):
-                    name = simple_data.get('name')
-                    value = simple_data.text
-                    if name and value:
-                        gmr_info[name] = value
-                geometry = placemark.find('.//kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', ns)
-                if geometry is not None and geometry.text:
-                    coords_text = geometry.text.strip()
-                    coord_pairs = []
-                    for coord in coords_text.split():
-                        if ',' in coord:
-                            parts = coord.split(',')
-                            if len(parts) >= 2:
-                                coord_pairs.append([float(parts[1]), float(parts[0])])
-                    if coord_pairs:
-                        gmr_info['coordinates'] = coord_pairs
-                if gmr_info:
-                    gmr_data.append(gmr_info)
-        return pd.DataFrame(gmr_data)
+        return parse_layer(replace(GMR_LAYER, fields=None, required_key=None))
     except Exception as e:
         print(f"Erreur lors du parsing du fichier GMR.kml : {e}")
         return pd.DataFrame()
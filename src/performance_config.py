@@ -6,36 +6,55 @@
 CACHE_TTL_DATA = 300  # 5 minutes pour les données KML
 CACHE_TTL_SEARCH = 180  # 3 minutes pour les recherches
 CACHE_TTL_MAP = 180  # 3 minutes pour les cartes
+MAP_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Taille max du cache LRU des cartes, partagé par toutes les sessions
 
 # Paramètres de recherche
 MIN_SEARCH_LENGTH = 2  # Minimum de caractères pour déclencher une recherche
 MAX_SEARCH_RESULTS = 50  # Maximum de résultats affichés
+MAX_SEARCH_SUGGESTIONS = 8  # Noms proposés pour compléter le dernier mot saisi
+FUZZY_MATCH_CUTOFF = 0.4  # Score minimal (ratio de SequenceMatcher, comme difflib) d'un nom proposé pour une saisie mal orthographiée
+FUZZY_TOKEN_CUTOFF = 0.4  # Présélection : score minimal (Dice des trigrammes) d'un token rapproché d'un mot saisi
 AUTO_SELECT_COUNT = 0  # Nombre de résultats automatiquement sélectionnés
 
+# Paramètres de recherche de postes à proximité (KD-tree)
+PROXIMITY_DEFAULT_RADIUS_KM = 20.0
+PROXIMITY_MAX_RADIUS_KM = 200.0
+PROXIMITY_DEFAULT_COUNT = 5  # Nombre de postes les plus proches par défaut
+
 # Paramètres de carte
 MAP_DEFAULT_ZOOM = 6
 MAP_SINGLE_POSTE_ZOOM = 10
 MAP_CANVAS_OPTIMIZATION = True  # Utiliser prefer_canvas pour de meilleures performances
+MAP_COORDINATE_PRECISION = 5  # Décimales des sommets envoyés au navigateur (1e-5° ≈ 1 m), encodés en polyline ; None = JSON brut
+MAP_CLUSTER_THRESHOLD = 20  # Au-delà, les postes affichés sont regroupés en clusters (FastMarkerCluster) ; inférieur à MAX_SEARCH_RESULTS
 
 # Paramètres anti-reload pour st_folium
 MAP_RETURN_ON_HOVER = False  # Désactiver les événements de survol
-MAP_RETURNED_OBJECTS = []  # Ne retourner aucun objet pour éviter les reloads
+# Zoom (niveau de détail) et popup cliqué (identifiant de la fiche détaillée), jamais le survol.
+# L'emprise ("bounds") n'est demandée que si les zones sont découpées à la vue : sinon chaque
+# déplacement de la carte relancerait le script pour rien
+MAP_RETURNED_OBJECTS = ["zoom", "last_object_clicked_popup"]
 MAP_USE_CONTAINER_WIDTH = False  # Largeur fixe pour plus de stabilité
 
-# Paramètres de polygones
-POLYGON_SIMPLIFICATION_STEPS = {
-    'low': {'small': 1, 'medium': 2, 'large': 4, 'huge': 8},
-    'medium': {'small': 1, 'medium': 1, 'large': 2, 'huge': 4},
-    'high': {'small': 1, 'medium': 1, 'large': 1, 'huge': 2}
-}
+# Découpage à la vue : avec « Afficher tous les GMR/GDP », seuls les polygones visibles sont envoyés
+MAP_VIEWPORT_CULLING = True
+MAP_VIEWPORT_MARGIN = 0.25  # Marge autour de la vue (fraction de sa taille) pour absorber les petits déplacements
+MAP_VIEWPORT_MIN_SPAN = 1.0  # Taille minimale (degrés) de la vue estimée avant le premier retour de la carte
+
+# Couches complètes GMR/GDP écrites une fois par version dans static/ et référencées par URL
+# (nécessite server.enableStaticServing, sinon retour au découpage à la vue)
+MAP_STATIC_LAYERS = True
 
-# Seuils de taille pour la simplification des polygones
-POLYGON_SIZE_THRESHOLDS = {
-    'small': 100,
-    'medium': 500,
-    'large': 2000,
-    'huge': float('inf')
+# Niveaux de détail des polygones GMR/GDP : tolérance Douglas-Peucker en mètres
+# Tous les niveaux sont précalculés une seule fois à la construction du cache dans data/
+POLYGON_LOD_TOLERANCES = {
+    'fine': 10,
+    'medium': 50,
+    'coarse': 250
 }
+POLYGON_DEFAULT_LOD = 'medium'  # Niveau servi hors carte (attributs, jointures)
+# Sur la carte, le niveau suit le zoom : le plus simplifié dont la tolérance reste sous ce nombre de pixels
+POLYGON_LOD_PIXEL_TOLERANCE = 1.0
 
 # Configuration d'affichage
 DISPLAY_COLUMNS = ['Nom_du_pos', 'Identifian', 'Tension_d', 'latitude', 'longitude']
@@ -49,6 +68,12 @@ HELP_MESSAGES = {
     'search_no_input': "🔍 Saisissez le nom d'un poste pour commencer la recherche.",
     'too_many_results': "⚠️ {} résultats trouvés. Seuls les {} premiers sont affichés. Précisez votre recherche.",
     'no_results': "❌ Aucun poste trouvé pour '{}'. Essayez un autre terme.",
+    'did_you_mean': "Vouliez-vous dire :",
     'select_postes': "⚠️ Veuillez sélectionner au moins un poste dans le tableau pour afficher les détails.",
-    'precision_info': "💡 La précision maximale améliore les contours mais augmente le temps de chargement."
+    'proximity_placeholder': "Ex: 48.390394, -4.486076",
+    'proximity_no_input': "📍 Saisissez les coordonnées d'un point (latitude, longitude) pour trouver les postes à proximité.",
+    'proximity_invalid': "💡 Coordonnées invalides : utilisez le format « latitude, longitude » en degrés décimaux.",
+    'no_nearby': "❌ Aucun poste trouvé à moins de {} km de ce point.",
+    'selection_no_drawing': "✏️ Dessinez un polygone ou un rectangle sur la carte pour lister les postes qu'il contient.",
+    'no_drawn_postes': "❌ Aucun poste dans la zone dessinée."
 }
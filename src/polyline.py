@@ -0,0 +1,78 @@
+"""
+Encodage compact des anneaux envoyés au navigateur : quantification + polyline (algorithme Google)
+
+Chaque coordonnée est arrondie à `precision` décimales puis remplacée par son écart au sommet
+précédent ; les deltas, petits entiers, sont écrits par paquets de 5 bits en caractères ASCII
+(63 à 126). Un sommet coûte ainsi 2 à 6 octets au lieu d'environ 40 en JSON pleine précision.
+Le décodage se fait dans le navigateur (POLYLINE_DECODER_JS).
+"""
+import numpy as np
+
+# Décodeur JavaScript : chaîne polyline -> anneau GeoJSON [[lon, lat], ...]
+# Les opérations bit à bit de JS sont sur 32 bits : précision limitée à 6 décimales
+POLYLINE_DECODER_JS = """function (encoded, factor) {
+    var ring = [], index = 0, lat = 0, lon = 0;
+    while (index < encoded.length) {
+        for (var axis = 0; axis < 2; axis++) {
+            var result = 0, shift = 0, b;
+            do {
+                b = encoded.charCodeAt(index++) - 63;
+                result |= (b & 0x1f) << shift;
+                shift += 5;
+            } while (b >= 0x20);
+            var delta = (result & 1) ? ~(result >> 1) : (result >> 1);
+            if (axis === 0) { lat += delta; } else { lon += delta; }
+        }
+        ring.push([lon / factor, lat / factor]);
+    }
+    return ring;
+}"""
+
+
+def encode_rings(rings, precision=5):
+    """Encode des anneaux [[lat, lon], ...] en chaînes polyline, en une passe numpy sur tous les sommets"""
+    if not 0 <= precision <= 6:
+        raise ValueError("La précision doit être comprise entre 0 et 6 décimales")
+    lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+    if not lengths.sum():
+        return [''] * len(rings)
+    quantized = np.rint(np.concatenate([np.asarray(ring, dtype=np.float64) for ring in rings if len(ring)]) * 10 ** precision).astype(np.int64)
+    # Écart au sommet précédent, le premier sommet de chaque anneau partant de 0
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[lengths > 0]
+    deltas[starts] = quantized[starts]
+    # Zigzag : entiers signés -> non signés (0, -1, 1, -2... -> 0, 1, 2, 3...)
+    values = deltas.ravel()
+    values = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+    n_chunks = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(5)
+    while rest.any():
+        n_chunks += rest > 0
+        rest >>= np.uint64(5)
+    value_offsets = np.concatenate(([0], np.cumsum(n_chunks)))
+    chars = np.empty(value_offsets[-1], dtype=np.uint8)
+    for k in range(int(n_chunks.max())):
+        has_chunk = n_chunks > k
+        chunk = (values[has_chunk] >> np.uint64(5 * k)) & np.uint64(0x1f)
+        # Bit 0x20 : un autre paquet suit pour la même valeur
+        chunk |= np.where(n_chunks[has_chunk] > k + 1, np.uint64(0x20), np.uint64(0))
+        chars[value_offsets[:-1][has_chunk] + k] = chunk + np.uint64(63)
+
+    text = chars.tobytes().decode('ascii')
+    # Deux valeurs (lat, lon) par sommet : bornes de chaque anneau dans le texte
+    ring_offsets = value_offsets[2 * np.concatenate(([0], np.cumsum(lengths)))]
+    return [text[start:end] for start, end in zip(ring_offsets[:-1].tolist(), ring_offsets[1:].tolist())]
+
+
+def decode_ring(encoded, precision=5):
+    """Inverse de encode_rings pour un anneau : tableau (n, 2) [lat, lon] quantifié"""
+    values, result, shift = [], 0, 0
+    for char in encoded:
+        b = ord(char) - 63
+        result |= (b & 0x1f) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result, shift = 0, 0
+    return np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
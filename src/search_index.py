@@ -0,0 +1,331 @@
+"""
+Index de recherche des postes par nom : index inversé token normalisé -> positions des postes
+
+Les noms sont normalisés (minuscules, sans accents, tirets et parenthèses comme séparateurs,
+articles retirés). Une requête renvoie les postes dont le nom contient tous ses tokens :
+intersection des listes de positions, en partant de la plus courte. Le coût dépend de la
+taille des listes concernées, pas du nombre total de postes.
+
+Le dernier mot en cours de saisie est traité comme un préfixe : les tokens qui le complètent
+forment une plage contiguë du tableau trié des tokens, trouvée par dichotomie (bisect).
+
+Les fautes de frappe sont rattrapées par FuzzyIndex : chaque mot saisi est rapproché des tokens
+de l'index les plus proches (listes de trigrammes, coefficient de Dice), les noms contenant ces
+tokens sont présélectionnés, puis seuls les meilleurs sont comparés à la saisie par SequenceMatcher.
+Remplace difflib.get_close_matches, qui faisait cette comparaison avec tous les noms.
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .datasets import DATASET_HASH_FUNCS
+from .performance_config import CACHE_TTL_DATA, FUZZY_MATCH_CUTOFF, FUZZY_TOKEN_CUTOFF
+
+ARTICLES = {"le", "la", "les", "l"}
+
+
+def _normalize(s):
+    s = str(s).lower()
+    s = unicodedata.normalize('NFKD', s)
+    s = ''.join([c for c in s if not unicodedata.combining(c)])
+    return re.sub(r"[-()]+", " ", s)
+
+
+def clean_and_split(s):
+    """Tokens normalisés d'un nom de poste (triés, articles retirés)"""
+    if pd.isna(s):
+        return []
+    words = [w for w in _normalize(s).split() if w not in ARTICLES]
+    return sorted(words)
+
+
+def split_query(text):
+    """(tokens complets, préfixe du dernier mot ou None) d'une saisie
+
+    Le dernier mot n'est un préfixe que s'il n'est suivi d'aucun séparateur et n'est pas un article.
+    """
+    if pd.isna(text):
+        return [], None
+    normalized = _normalize(text)
+    words = normalized.split()
+    prefix = None
+    if words and not normalized[-1].isspace() and words[-1] not in ARTICLES:
+        prefix = words.pop()
+    return sorted(w for w in words if w not in ARTICLES), prefix
+
+
+class TokenIndex:
+    """Index inversé des noms : postings[token] = positions (int32 triées) des lignes qui le contiennent"""
+
+    def __init__(self, names):
+        self.names = ["" if pd.isna(name) else str(name) for name in names]
+        self.n_rows = len(self.names)
+        row_tokens = [clean_and_split(name) for name in self.names]
+        postings = {}
+        for position, tokens in enumerate(row_tokens):
+            for token in set(tokens):
+                postings.setdefault(token, []).append(position)
+        # Positions ajoutées dans l'ordre des lignes : chaque liste est déjà triée
+        self.postings = {token: np.array(positions, dtype=np.int32) for token, positions in postings.items()}
+        # Tokens triés : ceux qui commencent par un préfixe donné sont contigus, leurs numéros forment un intervalle
+        self.tokens = sorted(self.postings)
+        self.token_lengths = np.array([len(token) for token in self.tokens], dtype=np.int32)
+        token_ids = {token: i for i, token in enumerate(self.tokens)}
+        # Numéros des tokens de chaque ligne (format CSR : ceux de la ligne i sont entre row_token_ptr[i] et [i + 1])
+        self.row_token_ids = np.array([token_ids[t] for tokens in row_tokens for t in tokens], dtype=np.int32)
+        self.row_token_ptr = np.concatenate(([0], np.cumsum([len(tokens) for tokens in row_tokens]))).astype(np.int64)
+        # Mêmes tokens regroupés par longueur, pour compléter un mot par les tokens les plus courts d'abord
+        self.tokens_by_length = {}
+        for token in self.tokens:
+            self.tokens_by_length.setdefault(len(token), []).append(token)
+        # Rang de chaque nom distinct (le plus court, puis alphabétique) : suggestions classées par np.unique
+        self.ranked_names = sorted(set(self.names), key=lambda name: (len(name), name))
+        rank = {name: code for code, name in enumerate(self.ranked_names)}
+        self.name_codes = np.array([rank[name] for name in self.names], dtype=np.int32)
+
+    def _intersect(self, tokens):
+        # Positions contenant tous les tokens, None si aucun token
+        if not tokens:
+            return None
+        lists = sorted((self.postings.get(token) for token in tokens), key=lambda p: -1 if p is None else len(p))
+        if lists[0] is None:
+            return np.empty(0, dtype=np.int32)
+        result = lists[0]
+        for positions in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, positions, assume_unique=True)
+        return result
+
+    def _completion_range(self, prefix, tokens):
+        start = bisect_left(tokens, prefix)
+        return start, bisect_left(tokens, prefix + "\uffff", start)
+
+    def completions(self, prefix, tokens=None):
+        """Tokens commençant par prefix (plage du tableau trié tokens, par défaut tous ceux de l'index)"""
+        tokens = self.tokens if tokens is None else tokens
+        start, end = self._completion_range(prefix, tokens)
+        return tokens[start:end]
+
+    def _shortest_completion(self, rows, prefix):
+        # Pour chaque ligne de rows, longueur du plus court de ses tokens commençant par prefix (0 si aucun)
+        start, end = self._completion_range(prefix, self.tokens)
+        counts = self.row_token_ptr[rows + 1] - self.row_token_ptr[rows]
+        owner = np.repeat(np.arange(len(rows)), counts)
+        flat = np.arange(counts.sum()) + np.repeat(self.row_token_ptr[rows] - np.cumsum(counts) + counts, counts)
+        ids = self.row_token_ids[flat]
+        matched = (ids >= start) & (ids < end)
+        none = np.iinfo(np.int32).max
+        shortest = np.full(len(rows), none, dtype=np.int32)
+        np.minimum.at(shortest, owner[matched], self.token_lengths[ids[matched]])
+        shortest[shortest == none] = 0
+        return shortest
+
+    def query(self, text, prefix=False):
+        """Positions (triées) des lignes dont le nom contient tous les tokens de text
+
+        Avec prefix=True, le dernier mot en cours de saisie n'a qu'à commencer un token du nom.
+        """
+        if not prefix:
+            tokens, last = clean_and_split(text), None
+        else:
+            tokens, last = split_query(text)
+        result = self._intersect(set(tokens))
+        if last is None:
+            # Requête réduite à des articles : tous les noms correspondent
+            return np.arange(self.n_rows, dtype=np.int32) if result is None else result
+        if result is not None:
+            # Candidats déjà restreints par les mots complets : test du préfixe sur les numéros de leurs tokens
+            return result[self._shortest_completion(result, last) > 0]
+        lists = [self.postings[token] for token in self.completions(last)]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        return lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+
+    def suggest(self, text, limit=8):
+        """Noms de postes distincts complétant la saisie, les plus proches de ce qui est tapé en premier
+
+        Classement : token complétant le dernier mot le plus court (le mot exact en tête), puis nom le plus court.
+        """
+        tokens, last = split_query(text)
+        if last is None:
+            return []
+        candidates = self._intersect(set(tokens))
+        if candidates is not None:
+            # Mots complets déjà saisis : classement des candidats d'après leurs propres tokens
+            shortest = self._shortest_completion(candidates, last)
+            matched = shortest > 0
+            shortest, codes = shortest[matched], self.name_codes[candidates[matched]]
+            ordered = codes[np.lexsort((codes, shortest))].tolist()
+        else:
+            ordered = self._ranked_completions(last, limit)
+        suggestions, seen = [], set()
+        for code in ordered:
+            if code not in seen:
+                seen.add(code)
+                suggestions.append(self.ranked_names[code])
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def _ranked_completions(self, last, limit):
+        # Codes des noms complétant last, tokens les plus courts d'abord ; arrêt dès limit noms distincts
+        ordered = []
+        for length in sorted(self.tokens_by_length):
+            if length < len(last):
+                continue
+            band = self.completions(last, self.tokens_by_length[length])
+            if band:
+                ordered.extend(np.unique(np.concatenate([self.name_codes[self.postings[t]] for t in band])).tolist())
+                if len(set(ordered)) >= limit:
+                    break
+        return ordered
+
+
+def _name_key(s):
+    # Nom normalisé, articles compris, mots dans l'ordre d'origine
+    return " ".join(_normalize(s).split())
+
+
+def _sorted_key(s):
+    # Tokens triés, articles retirés : insensible à l'ordre des mots
+    return " ".join(clean_and_split(s))
+
+
+def _trigrams(key):
+    # Trigrammes de chaque mot précédé de deux espaces et suivi d'un (comme pg_trgm) : début de mot pondéré
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FuzzyIndex:
+    """Recherche tolérante aux fautes sur un TokenIndex : trigrammes des tokens, noms classés par score"""
+
+    def __init__(self, token_index, token_candidates=8, name_candidates=20):
+        self.token_index = token_index
+        self.token_candidates = token_candidates
+        self.name_candidates = name_candidates
+        # Première ligne de chaque nom exact (minuscules, espaces retirés)
+        self.exact = {}
+        for position, name in enumerate(token_index.names):
+            self.exact.setdefault(name.strip().lower(), position)
+        postings, gram_counts = {}, []
+        for token_id, token in enumerate(token_index.tokens):
+            grams = _trigrams(token)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(token_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.gram_counts = np.array(gram_counts, dtype=np.int32)
+        self.row_token_counts = np.diff(token_index.row_token_ptr).astype(np.int32)
+        # Clés de comparaison de chaque nom distinct (même numérotation que token_index.ranked_names)
+        self.name_keys = [(_name_key(name), _sorted_key(name)) for name in token_index.ranked_names]
+
+    def similar_tokens(self, word, cutoff=FUZZY_TOKEN_CUTOFF):
+        """(numéros de tokens, scores) des token_candidates tokens les plus proches de word, score de Dice >= cutoff"""
+        grams = _trigrams(word)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        # Un score >= cutoff impose au moins min_shared trigrammes communs (Dice = 2 x communs / somme des tailles)
+        min_shared = max(1, math.ceil(cutoff * len(grams) / (2 - cutoff) - 1e-9))
+        if len(lists) < min_shared:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        # Trigrammes communs avec chaque token : un comptage sur le vocabulaire, pas sur les noms
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.gram_counts))
+        candidates = np.flatnonzero(counts >= min_shared)
+        shared = counts[candidates]
+        scores = 2 * shared / (len(grams) + self.gram_counts[candidates])
+        kept = np.flatnonzero(scores >= cutoff)
+        if len(kept) > self.token_candidates:
+            kept = kept[np.argpartition(-scores[kept], self.token_candidates - 1)[:self.token_candidates]]
+        best = kept[np.lexsort((candidates[kept], -scores[kept]))]
+        return candidates[best], scores[best]
+
+    def match(self, text, limit=5, cutoff=FUZZY_MATCH_CUTOFF):
+        """[(position, score)] des noms distincts les plus proches de text, score >= cutoff, décroissant
+
+        Présélection : tokens proches de chaque mot saisi (Dice des trigrammes >= FUZZY_TOKEN_CUTOFF), puis
+        2 x somme des scores des tokens du nom rapprochés des mots saisis / (mots saisis + tokens du nom).
+        Score renvoyé : ratio de SequenceMatcher comme difflib.get_close_matches, le meilleur entre noms normalisés
+        dans l'ordre (articles compris) et mots triés sans articles.
+        """
+        words = set(clean_and_split(text))
+        rows, similarity = [], []
+        for word in words:
+            token_ids, scores = self.similar_tokens(word)
+            if not len(token_ids):
+                continue
+            word_rows = [self.token_index.postings[self.token_index.tokens[t]] for t in token_ids.tolist()]
+            word_scores = np.repeat(scores, [len(r) for r in word_rows])
+            word_rows = np.concatenate(word_rows)
+            # Meilleur token du mot pour chaque ligne (scores décroissants : première occurrence)
+            order = np.argsort(-word_scores, kind='stable')
+            unique_rows, first = np.unique(word_rows[order], return_index=True)
+            rows.append(unique_rows)
+            similarity.append(word_scores[order][first])
+        if not rows:
+            return []
+        rows, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        total = np.bincount(inverse, weights=np.concatenate(similarity))
+        scores = 2 * total / (len(words) + self.row_token_counts[rows])
+        codes = self.token_index.name_codes[rows]
+        # Une ligne par nom (les lignes d'un même nom ont le même score), à score égal le nom le plus court
+        order = np.lexsort((rows, codes, -scores))
+        _, first = np.unique(codes[order], return_index=True)
+        pool = rows[order[np.sort(first)[:self.name_candidates]]].tolist()
+
+        matchers = []
+        for key in (_name_key, _sorted_key):
+            matcher = SequenceMatcher()
+            matcher.set_seq2(key(text))
+            matchers.append(matcher)
+        ranked = []
+        for position in pool:
+            code = self.token_index.name_codes[position]
+            # Inutile de calculer un ratio qui ne peut entrer dans les limit premiers : majorants rapides d'abord (comme difflib)
+            threshold = cutoff if len(ranked) < limit else -ranked[limit - 1][0]
+            score = 0.0
+            for matcher, name_key in zip(matchers, self.name_keys[code]):
+                matcher.set_seq1(name_key)
+                bound = max(threshold, score)
+                if matcher.real_quick_ratio() >= bound and matcher.quick_ratio() >= bound:
+                    score = max(score, matcher.ratio())
+            if score >= threshold:
+                ranked.append((-score, code, position))
+                ranked.sort()
+        return [(position, -score) for score, _, position in ranked[:limit]]
+
+    def best(self, text, cutoff=FUZZY_MATCH_CUTOFF):
+        """Position du nom exact (à la casse près), sinon du nom le plus proche ; None si aucun n'atteint cutoff"""
+        if pd.isna(text) or not str(text).strip():
+            return None
+        position = self.exact.get(str(text).strip().lower())
+        if position is not None:
+            return position
+        matches = self.match(text, 1, cutoff)
+        return matches[0][0] if matches else None
+
+
+def _poste_names(postes):
+    postes_df = postes.df
+    nom_col = 'Nom poste' if 'Nom poste' in postes_df.columns else 'Nom_du_pos'
+    return postes_df[nom_col].tolist()
+
+
+# Index construits une fois par version des postes, partagés entre pages et sessions
+@st.cache_resource(ttl=CACHE_TTL_DATA, hash_funcs=DATASET_HASH_FUNCS, show_spinner=False)
+def postes_token_index(postes):
+    """Index inversé des noms de postes (token normalisé -> positions)"""
+    return TokenIndex(_poste_names(postes))
+
+
+@st.cache_resource(ttl=CACHE_TTL_DATA, hash_funcs=DATASET_HASH_FUNCS, show_spinner=False)
+def postes_fuzzy_index(postes):
+    """Index trigrammes des tokens des noms de postes, pour la recherche tolérante aux fautes"""
+    return FuzzyIndex(postes_token_index(postes))
@@ -0,0 +1,87 @@
+"""
+Simplification de polygones Douglas-Peucker vectorisée (numpy) avec niveaux de détail
+
+Plutôt que de relancer l'algorithme pour chaque tolérance, on calcule une seule fois
+la « significance » de chaque sommet : la tolérance en dessous de laquelle Douglas-Peucker
+le conserverait. Un niveau de détail n'est ensuite qu'un masque significance > tolérance.
+"""
+import numpy as np
+
+EARTH_METERS_PER_DEGREE = 111_320.0
+
+
+def _project_meters(coords):
+    # Projection équirectangulaire locale : suffisante pour comparer des distances de l'ordre du km
+    lat0 = np.radians(coords[:, 0].mean())
+    return np.column_stack((coords[:, 1] * np.cos(lat0), coords[:, 0])) * EARTH_METERS_PER_DEGREE
+
+
+def _segment_distances(points, starts, ends):
+    # Distance de chaque point au segment [start, end] qui lui est associé
+    seg = ends - starts
+    seg_len2 = np.einsum('ij,ij->i', seg, seg)
+    rel = points - starts
+    t = np.divide(np.einsum('ij,ij->i', rel, seg), seg_len2, out=np.zeros(len(points)), where=seg_len2 > 0)
+    proj = starts + np.clip(t, 0.0, 1.0)[:, None] * seg
+    return np.hypot(*(points - proj).T)
+
+
+def significance(coords):
+    """Tolérance (en mètres) au-delà de laquelle chaque sommet d'un anneau [lat, lon] est supprimé
+
+    Toutes les subdivisions d'une même profondeur sont traitées en une seule passe numpy.
+    Les extrémités et le sommet le plus éloigné du premier (découpe de l'anneau fermé) valent inf.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    sig = np.full(n, np.inf)
+    if n <= 3:
+        return sig
+    xy = _project_meters(coords)
+    sig[1:-1] = 0.0
+
+    # Anneau fermé : on le coupe en deux polylignes au sommet le plus éloigné du premier
+    far = 1 + int(np.argmax(np.hypot(*(xy[1:-1] - xy[0]).T)))
+    keys = np.array([0, far, n - 1])
+    sig[far] = np.inf
+    # Seuil d'existence de chaque segment [keys[k], keys[k + 1]]
+    seg_limit = np.full(len(keys) - 1, np.inf)
+
+    while True:
+        gaps = np.diff(keys)
+        active = gaps > 1
+        if not active.any():
+            break
+        a, b, limit = keys[:-1][active], keys[1:][active], seg_limit[active]
+        counts = gaps[active] - 1
+        seg_of_point = np.repeat(np.arange(len(a)), counts)
+        # Indices des sommets intérieurs de chaque segment actif, concaténés
+        first = np.repeat(a + 1, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        idx = first + within
+        dist = _segment_distances(xy[idx], xy[a[seg_of_point]], xy[b[seg_of_point]])
+        # Sommet le plus éloigné de chaque segment : dernier élément de chaque groupe après tri
+        order = np.lexsort((dist, seg_of_point))
+        best = order[np.cumsum(counts) - 1]
+        split = idx[best]
+        split_sig = np.minimum(dist[best], limit)
+        sig[split] = split_sig
+
+        # Chaque segment actif devient [a, split] et [split, b]
+        new_keys = np.concatenate((keys, split))
+        order_keys = np.argsort(new_keys, kind='stable')
+        # Le seuil d'un segment est celui de la découpe qui l'a créé, sinon celui de son parent
+        key_limits = np.concatenate((np.full(len(keys), np.nan), split_sig))[order_keys]
+        keys = new_keys[order_keys]
+        seg_limit = np.repeat(seg_limit, np.where(active, 2, 1))
+        seg_limit = np.where(np.isnan(key_limits[:-1]), seg_limit, key_limits[:-1])
+        seg_limit = np.where(np.isnan(key_limits[1:]), seg_limit, key_limits[1:])
+    return sig
+
+
+def lod_mask(sig, tolerance, min_points=4):
+    """Masque des sommets conservés à la tolérance donnée (au moins min_points pour garder un polygone)"""
+    mask = sig > tolerance
+    if mask.sum() < min(min_points, len(sig)):
+        mask[np.argsort(sig, kind='stable')[-min_points:]] = True
+    return mask
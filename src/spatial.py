@@ -0,0 +1,449 @@
+"""
+Requêtes spatiales sur les postes, GMR et GDP (jointure poste → zones précalculée)
+"""
+import os
+import weakref
+import numpy as np
+from .cache_manifest import ensure_artifact
+from .config import get_kml_path
+from .geo_cache import BBOX_COLUMN, EDGES_COLUMN, GEOMETRY_COLUMN, ring_bboxes, ring_edges
+from .parsers import POSTES_LAYER, GMR_LAYER, GDP_LAYER, PARSER_VERSION, read_layer
+
+# Colonnes ajoutées à la table des postes : position de la ligne GMR/GDP contenant le poste (-1 si aucune)
+ZONE_COLUMNS = ['gmr_idx', 'gdp_idx']
+ZONES_JOIN_VERSION = 2
+# Taille maximale (points x arêtes) d'un bloc de calcul, pour borner la mémoire du noyau
+KERNEL_BLOCK_SIZE = 4_000_000
+# Nombre d'enfants par nœud du R-tree
+STR_NODE_CAPACITY = 8
+# Nombre maximal de postes par feuille du KD-tree
+KDTREE_LEAF_SIZE = 32
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _as_ring(polygon_coords):
+    if not isinstance(polygon_coords, (list, np.ndarray)) or len(polygon_coords) < 3:
+        return None
+    return np.asarray(polygon_coords, dtype=np.float64)
+
+
+def _ring_geometry(ring):
+    # Boîte et table des arêtes d'un anneau hors cache (parsing direct des KML)
+    offsets = np.array([0, len(ring)])
+    return ring_bboxes(ring, offsets)[0], ring_edges(ring, offsets)
+
+
+def zone_geometries(zones_df):
+    """(anneau, boîte, arêtes) de chaque ligne : vues sur le cache, calculées seulement si elles y manquent"""
+    if GEOMETRY_COLUMN not in zones_df:
+        return []
+    if BBOX_COLUMN in zones_df and EDGES_COLUMN in zones_df:
+        return [(ring, bbox, edges) if _as_ring(ring) is not None else (None, None, None)
+                for ring, bbox, edges in zip(zones_df[GEOMETRY_COLUMN], zones_df[BBOX_COLUMN], zones_df[EDGES_COLUMN])]
+    rings = [_as_ring(coords) for coords in zones_df[GEOMETRY_COLUMN]]
+    return [(ring, *_ring_geometry(ring)) if ring is not None else (None, None, None) for ring in rings]
+
+
+def point_in_zone(lat, lon, ring, bbox, edges):
+    """Vrai si le point est dans l'anneau : rejet sur la boîte englobante, puis ray casting sur la table d'arêtes"""
+    if not (bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]):
+        return False
+    crosses = (edges[:, 0] < lat) & (lat <= edges[:, 1]) & (lon <= (lat - ring[:, 0]) * edges[:, 2] + ring[:, 1])
+    return np.count_nonzero(crosses) % 2 == 1
+
+
+def points_in_polygon(lats, lons, polygon_coords, bbox=None, edges=None):
+    """Masque des points (lats, lons) contenus dans le polygone [[lat, lon], ...] : ray casting en une passe numpy
+
+    Même règle que le ray casting historique : arête (i, i + 1 mod n) croisée si
+    min(y1, y2) < lat <= max(y1, y2) et lon <= abscisse d'intersection.
+    bbox et edges (colonnes du cache géométrique) évitent de les recalculer à chaque appel.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    inside = np.zeros(len(lats), dtype=bool)
+    ring = _as_ring(polygon_coords)
+    if ring is None:
+        return inside
+    if bbox is None or edges is None:
+        bbox, edges = _ring_geometry(ring)
+    lat_min, lon_min, lat_max, lon_max = bbox
+    candidates = np.flatnonzero((lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max))
+    if not len(candidates):
+        return inside
+
+    y1, x1 = ring[:, 0], ring[:, 1]
+    # Les arêtes horizontales ne sont jamais croisées (lat_min == lat_max)
+    edge_min, edge_max, inv_slope = edges[:, 0], edges[:, 1], edges[:, 2]
+
+    block = max(1, KERNEL_BLOCK_SIZE // len(ring))
+    for start in range(0, len(candidates), block):
+        idx = candidates[start:start + block]
+        y = lats[idx, None]
+        x = lons[idx, None]
+        crosses = (edge_min < y) & (y <= edge_max) & (x <= (y - y1) * inv_slope + x1)
+        inside[idx] = np.count_nonzero(crosses, axis=1) % 2 == 1
+    return inside
+
+
+def points_in_polygons(lats, lons, polygons):
+    """Matrice (n_points, n_polygones) d'appartenance de chaque point à chaque polygone"""
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    matrix = np.zeros((len(lats), len(polygons)), dtype=bool)
+    for pos, polygon_coords in enumerate(polygons):
+        matrix[:, pos] = points_in_polygon(lats, lons, polygon_coords)
+    return matrix
+
+
+def assign_points_to_zones(lats, lons, zones_df):
+    """Position (iloc) de la première zone contenant chaque point, -1 si aucune"""
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    geometries = zone_geometries(zones_df)
+    return _first_zone(lats, lons, geometries, range(len(geometries)))
+
+
+def _first_zone(lats, lons, geometries, positions):
+    # Première zone (dans l'ordre croissant de positions) contenant chaque point
+    result = np.full(len(lats), -1, dtype=np.int32)
+    for pos in positions:
+        pending = np.flatnonzero(result < 0)
+        if not len(pending):
+            break
+        ring, bbox, edges = geometries[pos]
+        if ring is not None:
+            result[pending[points_in_polygon(lats[pending], lons[pending], ring, bbox, edges)]] = pos
+    return result
+
+
+def _str_tiles(boxes, capacity):
+    # Sort-Tile-Recursive : tranches verticales triées par longitude, puis tri par latitude dans chaque tranche
+    n = len(boxes)
+    n_slices = int(np.ceil(np.sqrt(np.ceil(n / capacity))))
+    slice_size = n_slices * capacity
+    by_lon = np.argsort((boxes[:, 1] + boxes[:, 3]) / 2, kind='stable')
+    lat_centers = (boxes[by_lon, 0] + boxes[by_lon, 2]) / 2
+    perm = by_lon[np.lexsort((lat_centers, np.arange(n) // slice_size))]
+    starts = np.arange(0, n, capacity)
+    bounds = np.column_stack([
+        np.minimum.reduceat(boxes[perm, :2], starts),
+        np.maximum.reduceat(boxes[perm, 2:], starts),
+    ])
+    return perm, starts, np.append(starts[1:], n), bounds
+
+
+def _expand_ranges(lo, hi):
+    # Concatène les intervalles [lo, hi[ sans boucle Python
+    lengths = hi - lo
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(lo - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+
+
+def _intersects(boxes, lat_min, lon_min, lat_max, lon_max):
+    return (boxes[:, 0] <= lat_max) & (boxes[:, 2] >= lat_min) & (boxes[:, 1] <= lon_max) & (boxes[:, 3] >= lon_min)
+
+
+class STRTree:
+    """R-tree statique empaqueté (Sort-Tile-Recursive) sur des boîtes [lat_min, lon_min, lat_max, lon_max]
+
+    Chaque niveau est un tableau de boîtes de nœuds et d'intervalles [lo, hi[ vers le niveau
+    inférieur (ou vers self.order pour les feuilles) : une requête descend l'arbre niveau par niveau.
+    """
+
+    def __init__(self, boxes, node_capacity=STR_NODE_CAPACITY):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.levels = []
+        self.order = np.arange(len(self.boxes))
+        if not len(self.boxes):
+            return
+        self.order, lo, hi, bounds = _str_tiles(self.boxes, node_capacity)
+        levels = [(bounds, lo, hi)]
+        while len(bounds) > node_capacity:
+            perm, lo, hi, bounds = _str_tiles(bounds, node_capacity)
+            below_bounds, below_lo, below_hi = levels[-1]
+            levels[-1] = (below_bounds[perm], below_lo[perm], below_hi[perm])
+            levels.append((bounds, lo, hi))
+        self.levels = levels[::-1]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def query(self, lat_min, lon_min, lat_max, lon_max):
+        """Indices (triés) des boîtes qui intersectent la boîte demandée"""
+        if not self.levels:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(len(self.levels[0][0]))
+        for bounds, lo, hi in self.levels:
+            nodes = nodes[_intersects(bounds[nodes], lat_min, lon_min, lat_max, lon_max)]
+            nodes = _expand_ranges(lo[nodes], hi[nodes])
+        items = self.order[nodes]
+        return np.sort(items[_intersects(self.boxes[items], lat_min, lon_min, lat_max, lon_max)])
+
+    def query_point(self, lat, lon):
+        """Indices (triés) des boîtes qui contiennent le point"""
+        return self.query(lat, lon, lat, lon)
+
+
+class ZoneIndex:
+    """Index spatial d'une table de zones (GMR ou GDP) : R-tree sur les boîtes englobantes des polygones"""
+
+    def __init__(self, zones_df):
+        self.geometries = zone_geometries(zones_df)
+        # Les lignes sans polygone exploitable ne sont pas indexées
+        self.positions = np.array([pos for pos, (ring, _, _) in enumerate(self.geometries) if ring is not None], dtype=np.int64)
+        self.tree = STRTree([self.geometries[pos][1] for pos in self.positions])
+
+    def candidates(self, lat, lon):
+        """Positions des zones dont la boîte englobante contient le point"""
+        return self.positions[self.tree.query_point(lat, lon)]
+
+    def intersecting(self, lat_min, lon_min, lat_max, lon_max):
+        """Positions (croissantes) des zones dont la boîte englobante intersecte la boîte demandée"""
+        return self.positions[self.tree.query(lat_min, lon_min, lat_max, lon_max)]
+
+    def locate(self, lat, lon):
+        """Position de la première zone contenant le point, -1 si aucune"""
+        for pos in self.candidates(lat, lon):
+            if point_in_zone(lat, lon, *self.geometries[pos]):
+                return int(pos)
+        return -1
+
+
+# Index construits, un par table chargée (libérés avec la table)
+_ZONE_INDEXES = {}
+
+
+def zone_index(zones_df):
+    """Index spatial de la table de zones, construit une seule fois par table chargée"""
+    key = id(zones_df)
+    index = _ZONE_INDEXES.get(key)
+    if index is None:
+        index = _ZONE_INDEXES[key] = ZoneIndex(zones_df)
+        weakref.finalize(zones_df, _ZONE_INDEXES.pop, key, None)
+    return index
+
+
+def _overlaps(zone, other):
+    # Au moins un sommet d'un anneau dans l'autre : détecte tout recouvrement entre deux zones
+    # découpées l'une dans l'autre (un sommet posé sur la frontière commune peut compter en trop).
+    # Un échantillon de sommets suffit presque toujours à conclure, les anneaux complets en dernier recours
+    for sampled in (True, False):
+        for (ring, _, _), container in ((zone, other), (other, zone)):
+            vertices = ring[::max(1, len(ring) // 16)] if sampled else ring
+            if points_in_polygon(vertices[:, 0], vertices[:, 1], *container).any():
+                return True
+    return False
+
+
+class ZoneHierarchy:
+    """Hiérarchie GMR → GDP vérifiée géométriquement : les GDP qui recouvrent chaque GMR
+
+    L'attribut GMR des GDP n'est pas utilisé : seule la géométrie fait foi. Un GDP à cheval sur
+    deux GMR est rattaché aux deux. Le recouvrement est détecté par les sommets : un GDP qui
+    traverse un GMR sans avoir de sommet dedans lui échappe. Une recherche résout le GMR, teste
+    ses GDP, puis tous les GDP si aucun ne contient le point.
+    """
+
+    def __init__(self, gmr_df, gdp_df):
+        self.gmr_index = zone_index(gmr_df)
+        self.gdp_index = zone_index(gdp_df)
+        children = [[] for _ in self.gmr_index.geometries]
+        for gdp_pos in self.gdp_index.positions:
+            gdp = self.gdp_index.geometries[gdp_pos]
+            for gmr_pos in self.gmr_index.positions[self.gmr_index.tree.query(*gdp[1])]:
+                if _overlaps(gdp, self.gmr_index.geometries[gmr_pos]):
+                    children[gmr_pos].append(gdp_pos)
+        # Format CSR : les GDP du GMR i sont children[offsets[i]:offsets[i + 1]], en ordre croissant
+        self.child_offsets = np.zeros(len(children) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in children], out=self.child_offsets[1:])
+        self.children = np.array([pos for c in children for pos in c], dtype=np.int64)
+        self.child_bboxes = np.array([self.gdp_index.geometries[pos][1] for pos in self.children]).reshape(-1, 4)
+
+    def gdp_positions(self, gmr_pos):
+        """Positions des GDP qui recouvrent le GMR"""
+        return self.children[self.child_offsets[gmr_pos]:self.child_offsets[gmr_pos + 1]]
+
+    def locate(self, lat, lon):
+        """(position du GMR, position du GDP) contenant le point, -1 si aucun"""
+        gmr_pos = self.gmr_index.locate(lat, lon)
+        if gmr_pos < 0:
+            # Hors de tout GMR : aucun sous-ensemble de GDP ne peut être garanti
+            return gmr_pos, self.gdp_index.locate(lat, lon)
+        start, end = self.child_offsets[gmr_pos], self.child_offsets[gmr_pos + 1]
+        boxes = self.child_bboxes[start:end]
+        inside_box = (boxes[:, 0] <= lat) & (lat <= boxes[:, 2]) & (boxes[:, 1] <= lon) & (lon <= boxes[:, 3])
+        for gdp_pos in self.children[start:end][inside_box]:
+            if point_in_zone(lat, lon, *self.gdp_index.geometries[gdp_pos]):
+                return gmr_pos, int(gdp_pos)
+        # GDP non rattaché au GMR (recouvrement sans sommet commun) : recherche complète
+        return gmr_pos, self.gdp_index.locate(lat, lon)
+
+    def locate_many(self, lats, lons):
+        """Positions (GMR, GDP) de chaque point : GDP cherchés seulement parmi ceux du GMR trouvé"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        gmr = _first_zone(lats, lons, self.gmr_index.geometries, self.gmr_index.positions)
+        gdp = np.full(len(lats), -1, dtype=np.int32)
+        for gmr_pos in np.unique(gmr):
+            members = np.flatnonzero(gmr == gmr_pos)
+            positions = self.gdp_index.positions if gmr_pos < 0 else self.gdp_positions(gmr_pos)
+            gdp[members] = _first_zone(lats[members], lons[members], self.gdp_index.geometries, positions)
+        # Points sans GDP dans leur GMR : recherche parmi tous les GDP (recouvrement sans sommet commun)
+        missing = np.flatnonzero((gdp < 0) & (gmr >= 0))
+        if len(missing):
+            gdp[missing] = _first_zone(lats[missing], lons[missing], self.gdp_index.geometries, self.gdp_index.positions)
+        return gmr, gdp
+
+
+def _build_zones(cache_dir):
+    # Jointure en pleine précision, indépendante du niveau de détail affiché. read_layer et non
+    # load_layer : une couche illisible fait échouer la construction au lieu de figer une jointure vide
+    postes_df = read_layer(POSTES_LAYER)
+    lats, lons = postes_df['latitude'].to_numpy(), postes_df['longitude'].to_numpy()
+    hierarchy = ZoneHierarchy(read_layer(GMR_LAYER), read_layer(GDP_LAYER))
+    zones = np.column_stack(hierarchy.locate_many(lats, lons))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, 'zones.npy'), zones)
+
+
+def zones_artifact():
+    """Dossier de la table d'affectation poste → GMR/GDP (construite une seule fois par version des KML)"""
+    sources = [get_kml_path(spec.kml_filename) for spec in (POSTES_LAYER, GMR_LAYER, GDP_LAYER)]
+    params = {'parser_version': PARSER_VERSION, 'join_version': ZONES_JOIN_VERSION}
+    return ensure_artifact('postes_zones', sources, params, _build_zones)
+
+
+def attach_zone_columns(postes_df):
+    """Ajoute gmr_idx et gdp_idx à la table des postes (lecture de la jointure précalculée)"""
+    if postes_df.empty:
+        return postes_df
+    try:
+        zones = np.load(os.path.join(zones_artifact(), 'zones.npy'))
+        if len(zones) != len(postes_df):
+            raise ValueError("table d'affectation désynchronisée avec les postes")
+    except Exception as e:
+        print(f"Erreur lors du calcul de l'affectation postes → GMR/GDP : {e}")
+        return postes_df
+    postes_df = postes_df.copy()
+    postes_df[ZONE_COLUMNS] = zones
+    return postes_df
+
+
+def zone_row(zones_df, idx):
+    """Ligne de la zone à la position idx (None si le poste n'est dans aucune zone)"""
+    if idx is None or np.isnan(idx) or idx < 0 or idx >= len(zones_df):
+        return None
+    return zones_df.iloc[int(idx)]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique en km entre (lat1, lon1) et (lat2, lon2), vectorisée (formule de haversine)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _unit_vectors(lats, lons):
+    # Points (lat, lon) sur la sphère unité : la distance euclidienne (corde) croît avec la distance orthodromique
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class KDTree:
+    """KD-tree statique de points (lat, lon) projetés sur la sphère unité
+
+    Les nœuds couvrent des intervalles contigus de self.xyz (points réordonnés) ; une requête
+    parcourt l'arbre niveau par niveau en écartant les nœuds dont la boîte est hors de portée,
+    puis calcule les distances exactes (haversine) des seuls points retenus.
+    """
+
+    def __init__(self, lats, lons, leaf_size=KDTREE_LEAF_SIZE):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        # Points sans coordonnées (NaN) écartés de l'arbre
+        located = np.flatnonzero(np.isfinite(self.lats) & np.isfinite(self.lons))
+        xyz = _unit_vectors(self.lats[located], self.lons[located])
+        self.order = np.arange(len(xyz))
+        lo, hi, left = [0], [len(xyz)], [-1]
+        node = 0
+        while node < len(lo):
+            if hi[node] - lo[node] > leaf_size:
+                # Coupe à la médiane selon l'axe le plus étendu
+                idx = self.order[lo[node]:hi[node]]
+                points = xyz[idx]
+                axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+                mid = len(idx) // 2
+                self.order[lo[node]:hi[node]] = idx[np.argpartition(points[:, axis], mid)]
+                left[node] = len(lo)
+                lo += [lo[node], lo[node] + mid]
+                hi += [lo[node] + mid, hi[node]]
+                left += [-1, -1]
+            node += 1
+        self.xyz = xyz[self.order]
+        # self.order : position d'origine (dans lats/lons) de chaque point de self.xyz
+        self.order = located[self.order]
+        self.lo, self.hi, self.left = np.array(lo), np.array(hi), np.array(left)
+        # Les deux enfants d'un nœud interne sont consécutifs : right = left + 1
+        self.mins = np.empty((len(lo), 3))
+        self.maxs = np.empty((len(lo), 3))
+        for node in reversed(range(len(lo))):
+            if self.left[node] < 0:
+                points = self.xyz[self.lo[node]:self.hi[node]]
+                self.mins[node], self.maxs[node] = points.min(axis=0, initial=np.inf), points.max(axis=0, initial=-np.inf)
+            else:
+                children = [self.left[node], self.left[node] + 1]
+                self.mins[node], self.maxs[node] = self.mins[children].min(axis=0), self.maxs[children].max(axis=0)
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def _within(self, q, limit):
+        # Indices (dans self.xyz) des points à une corde au carré <= limit de q, et ces cordes au carré
+        frontier = np.array([0]) if len(self) else np.empty(0, dtype=np.int64)
+        leaves = []
+        while len(frontier):
+            gap = np.maximum(self.mins[frontier] - q, 0) + np.maximum(q - self.maxs[frontier], 0)
+            frontier = frontier[(gap ** 2).sum(axis=1) <= limit]
+            inner = self.left[frontier] >= 0
+            leaves.append(frontier[~inner])
+            frontier = np.concatenate([self.left[frontier[inner]], self.left[frontier[inner]] + 1])
+        leaves = np.concatenate(leaves) if leaves else np.empty(0, dtype=np.int64)
+        idx = _expand_ranges(self.lo[leaves], self.hi[leaves])
+        chord2 = ((self.xyz[idx] - q) ** 2).sum(axis=1)
+        keep = chord2 <= limit
+        return idx[keep], chord2[keep]
+
+    def _result(self, lat, lon, idx, chord2):
+        order = np.argsort(chord2, kind='stable')
+        positions = self.order[idx[order]]
+        return positions, haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+
+    def query_radius(self, lat, lon, radius_km):
+        """(positions, distances en km) des points à moins de radius_km, du plus proche au plus lointain"""
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        chord = 2 * np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2)
+        return self._result(lat, lon, *self._within(q, chord ** 2))
+
+    def query_nearest(self, lat, lon, k):
+        """(positions, distances en km) des k points les plus proches, du plus proche au plus lointain"""
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        # Descente vers le plus petit nœud proche de q qui contient encore k points :
+        # la k-ième distance dans ce nœud borne celle des k plus proches voisins
+        node = 0
+        while self.left[node] >= 0:
+            children = np.array([self.left[node], self.left[node] + 1])
+            children = children[self.hi[children] - self.lo[children] >= k]
+            if not len(children):
+                break
+            gap = np.maximum(self.mins[children] - q, 0) + np.maximum(q - self.maxs[children], 0)
+            node = children[np.argmin((gap ** 2).sum(axis=1))]
+        chord2 = ((self.xyz[self.lo[node]:self.hi[node]] - q) ** 2).sum(axis=1)
+        idx, chord2 = self._within(q, np.partition(chord2, k - 1)[k - 1])
+        nearest = np.argsort(chord2, kind='stable')[:k]
+        return self._result(lat, lon, idx[nearest], chord2[nearest])
@@ -0,0 +1,124 @@
+"""
+Couches complètes (« Afficher tous ») écrites une fois par version des données dans static/
+
+Ces couches sont identiques pour tous les utilisateurs et ne changent qu'avec les KML : plutôt que
+de les embarquer dans le HTML de chaque carte, on écrit une FeatureCollection encodée (polyline,
+voir map_utils.zones_feature_collection) par couche GMR/GDP et niveau de détail dans static/zones/,
+et les lignes du cluster de tous les postes (map_utils.postes_cluster_rows) dans static/postes/.
+Streamlit les sert comme fichiers statiques (server.enableStaticServing) ; la carte n'y fait
+qu'une référence (map_utils.StaticZonesLayer, map_utils.StaticPostesCluster) que le navigateur
+télécharge puis garde en cache.
+"""
+import glob
+import hashlib
+import json
+import os
+import streamlit as st
+from .cache_manifest import file_lock
+from .config import get_static_path, get_static_url
+from .datasets import layer_dataset, load_postes_dataset
+from .map_utils import GDP_TOOLTIP_FIELD, GMR_TOOLTIP_FIELD, postes_cluster_rows, zones_feature_collection
+from .parsers import GDP_LAYER, GMR_LAYER
+from .performance_config import MAP_COORDINATE_PRECISION, POLYGON_LOD_TOLERANCES
+
+STATIC_ZONES_DIR = "zones"
+STATIC_POSTES_DIR = "postes"
+STATIC_LAYER_FORMAT_VERSION = 1
+ZONE_LAYERS = {"GMR": (GMR_LAYER, GMR_TOOLTIP_FIELD), "GDP": (GDP_LAYER, GDP_TOOLTIP_FIELD)}
+
+
+def static_serving_enabled():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+def _asset_name(kind, zones):
+    # Nom dérivé de la version du Dataset (artefact KML + niveau) : une nouvelle version = un nouveau fichier
+    level = zones.version.rsplit(":", 1)[-1]
+    digest = hashlib.sha1(f"{zones.version}|{MAP_COORDINATE_PRECISION}|{STATIC_LAYER_FORMAT_VERSION}".encode("utf-8"))
+    return f"{kind.lower()}_{level}_{digest.hexdigest()[:16]}.json"
+
+
+def _write_asset(directory, name, lock_name, build):
+    # Écrit static/<directory>/<name> (JSON de build()) s'il manque, puis retire les versions précédentes
+    relative = f"{directory}/{name}"
+    path = get_static_path(relative)
+    if os.path.exists(path):
+        return relative
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with file_lock(get_static_path(f"{directory}/{lock_name}.lock")):
+        if os.path.exists(path):
+            return relative
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(build(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        # Les versions précédentes de la même couche (et du même niveau) ne sont plus référencées
+        prefix = name.rsplit("_", 1)[0]
+        # Nettoyage sans conséquence sur la couche écrite : un autre processus a pu retirer le fichier
+        for old in glob.glob(get_static_path(f"{directory}/{prefix}_*.json")):
+            if os.path.basename(old) != name:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return relative
+
+
+def zone_layer_asset(kind, zones):
+    """Chemin relatif (dans static/) de la couche complète kind ('GMR' | 'GDP') du Dataset zones, écrite si absente"""
+    def build():
+        collection = zones_feature_collection(zones.df, kind, ZONE_LAYERS[kind][1], MAP_COORDINATE_PRECISION)
+        collection["precision"] = MAP_COORDINATE_PRECISION
+        return collection
+
+    return _write_asset(STATIC_ZONES_DIR, _asset_name(kind, zones), kind.lower(), build)
+
+
+def postes_layer_asset(postes):
+    """Chemin relatif (dans static/) des lignes du cluster de tous les postes du Dataset postes, écrites si absentes"""
+    digest = hashlib.sha1(f"{postes.version}|{STATIC_LAYER_FORMAT_VERSION}".encode("utf-8"))
+    return _write_asset(STATIC_POSTES_DIR, f"postes_{digest.hexdigest()[:16]}.json", "postes",
+                        lambda: postes_cluster_rows(postes.df))
+
+
+def zone_layer_url(kind, zones):
+    """URL servie par Streamlit de la couche complète, None si le service statique est désactivé
+    ou si la couche ne peut pas être écrite (l'appelant se rabat sur le découpage à la vue)"""
+    if not static_serving_enabled():
+        return None
+    try:
+        return get_static_url(zone_layer_asset(kind, zones))
+    except OSError as e:
+        # static/ non inscriptible : la couche reste embarquée dans la carte
+        print(f"Couche statique {kind} indisponible : {e}")
+        return None
+
+
+def postes_layer_url(postes):
+    """URL servie par Streamlit des lignes du cluster de tous les postes, None si le service statique
+    est désactivé ou si le fichier ne peut pas être écrit (l'appelant embarque alors le cluster)"""
+    if not static_serving_enabled():
+        return None
+    try:
+        return get_static_url(postes_layer_asset(postes))
+    except OSError as e:
+        print(f"Couche statique des postes indisponible : {e}")
+        return None
+
+
+def build_static_zone_layers():
+    """Écrit les couches complètes GMR/GDP de tous les niveaux de détail (précalcul de build_cache.py)"""
+    for kind, (spec, _) in ZONE_LAYERS.items():
+        for level in (None, *POLYGON_LOD_TOLERANCES):
+            zone_layer_asset(kind, layer_dataset(spec, level))
+    return get_static_path(STATIC_ZONES_DIR)
+
+
+def build_static_postes_layer():
+    """Écrit les lignes du cluster de tous les postes (précalcul de build_cache.py)"""
+    postes_layer_asset(load_postes_dataset())
+    return get_static_path(STATIC_POSTES_DIR)